@@ -0,0 +1,149 @@
+"""
+Archive play for Hot and Cold Game
+Date window validation, per-client limits on cold dates and
+on-disk persistence of pre-computed rankings
+"""
+
+import os
+import time
+import logging
+from datetime import date, datetime, timedelta, timezone
+from threading import Lock
+from typing import Optional
+
+import numpy as np
+from fastapi import HTTPException, status
+
+from cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Primo giorno del gioco (stessa data usata per il numero del gioco)
+GAME_START_DATE = date(2025, 11, 1)
+
+# Directory dei ranking pre-calcolati (un file .npy per parola segreta)
+RANKINGS_DIR = os.getenv("RANKINGS_DIR", "rankings")
+
+# Quante date "fredde" (ranking non ancora pronto) un client può aprire per finestra
+ARCHIVE_COLD_DATES_PER_CLIENT = int(os.getenv("ARCHIVE_COLD_DATES_PER_CLIENT", "5"))
+ARCHIVE_CLIENT_WINDOW_SECONDS = int(os.getenv("ARCHIVE_CLIENT_WINDOW_SECONDS", "3600"))
+
+
+def today_utc() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def archive_window() -> tuple:
+    """
+    Intervallo di date giocabili: dall'inizio del gioco fino a domani (UTC).
+    Il giorno in più copre i client che usano la data locale (es. Italia, UTC+1/+2).
+    """
+    return GAME_START_DATE, today_utc() + timedelta(days=1)
+
+
+def validate_game_date(date_str: str) -> str:
+    """Verifica formato e finestra della data richiesta (400 se non valida)"""
+    try:
+        requested = date.fromisoformat(date_str)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Data non valida, usa il formato YYYY-MM-DD"
+        )
+
+    start, end = archive_window()
+    if not start <= requested <= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Data fuori dall'archivio ({start.isoformat()} - {end.isoformat()})"
+        )
+
+    return requested.isoformat()
+
+
+def archive_dates() -> list:
+    """Tutte le date dell'archivio, dalla più recente alla più vecchia"""
+    start, end = archive_window()
+    days = (end - start).days
+    return [(end - timedelta(days=i)).isoformat() for i in range(days + 1)]
+
+
+class ColdDateLimiter:
+    """
+    Limita quante date diverse con ranking non ancora pronto un singolo client
+    può richiedere in una finestra di tempo. Le date già calcolate non contano.
+    """
+
+    def __init__(
+        self,
+        max_dates: int = ARCHIVE_COLD_DATES_PER_CLIENT,
+        window_seconds: int = ARCHIVE_CLIENT_WINDOW_SECONDS,
+        max_clients: int = 10000
+    ):
+        self.max_dates = max_dates
+        self.window_seconds = window_seconds
+        self._clients = LRUCache(maxsize=max_clients)  # client -> {date: first_seen}
+        self._lock = Lock()
+        self.rejected = 0
+
+    def check(self, client_id: str, date_str: str) -> None:
+        """Registra la richiesta o solleva 429 se il client ha superato il limite"""
+        now = time.monotonic()
+
+        with self._lock:
+            seen = self._clients.get(client_id) or {}
+            seen = {d: t for d, t in seen.items() if now - t < self.window_seconds}
+
+            if date_str not in seen and len(seen) >= self.max_dates:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Troppe partite d'archivio in preparazione, riprova più tardi"
+                )
+
+            seen.setdefault(date_str, now)
+            self._clients.set(client_id, seen)
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._clients),
+            "rejected": self.rejected,
+        }
+
+
+class RankingStore:
+    """
+    Ranking persistiti su disco: un array int32 (rank per indice del vocabolario)
+    per ogni parola segreta. Calcolati una sola volta, poi caricati in mmap.
+    """
+
+    def __init__(self, directory: str = RANKINGS_DIR):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, secret_word: str) -> str:
+        return os.path.join(self.directory, f"{secret_word}.npy")
+
+    def exists(self, secret_word: str) -> bool:
+        return os.path.exists(self.path(secret_word))
+
+    def load(self, secret_word: str, vocab_size: int) -> Optional[np.ndarray]:
+        """Carica il ranking (mmap, sola lettura) o None se assente/obsoleto"""
+        path = self.path(secret_word)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            ranks = np.load(path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ranking corrotto per '{secret_word}': {e}")
+            return None
+
+        # Modello cambiato: il ranking va ricalcolato
+        if ranks.shape != (vocab_size,):
+            return None
+
+        return ranks
+
+    def count(self) -> int:
+        return sum(1 for name in os.listdir(self.directory) if name.endswith(".npy"))
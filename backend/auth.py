@@ -3,22 +3,49 @@ Authentication utilities for Hot and Cold Game
 JWT token management and password hashing
 """
 
+import os
+import time
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from threading import Lock
+from typing import Callable, Optional
 from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr
 
-from database import get_db, User
+from database import AsyncReadSessionLocal, get_async_read_db, User
+from state_store import TTLStore
 
 # Configuration
 SECRET_KEY = "your-secret-key-change-in-production-use-env-variable"  # TODO: Move to env
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
+# Cache dell'autenticazione: token già verificati (per la loro durata residua) e utenti
+# per id. Gli utenti vengono invalidati da invalidate_user(); con più worker le modifiche
+# fatte su un altro processo arrivano entro AUTH_USER_CACHE_TTL_SECONDS
+AUTH_USER_CACHE_TTL_SECONDS = int(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX = int(os.getenv("AUTH_CACHE_MAX", "20000"))
+
+token_cache = TTLStore("auth_tokens", ACCESS_TOKEN_EXPIRE_MINUTES * 60, AUTH_CACHE_MAX)
+user_cache = TTLStore("auth_users", AUTH_USER_CACHE_TTL_SECONDS, AUTH_CACHE_MAX)
+
+# bcrypt gira su un pool dedicato: al massimo BCRYPT_WORKERS hash in parallelo e
+# BCRYPT_QUEUE_MAX in attesa, oltre risponde 503 (l'event loop e la CPU del gioco restano liberi)
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "2"))
+BCRYPT_QUEUE_MAX = int(os.getenv("BCRYPT_QUEUE_MAX", "32"))
+
+# Tentativi di login/registrazione per IP e login falliti per username, per finestra
+LOGIN_WINDOW_SECONDS = int(os.getenv("LOGIN_WINDOW_SECONDS", "300"))
+LOGIN_MAX_ATTEMPTS_PER_IP = int(os.getenv("LOGIN_MAX_ATTEMPTS_PER_IP", "30"))
+LOGIN_MAX_FAILURES_PER_USERNAME = int(os.getenv("LOGIN_MAX_FAILURES_PER_USERNAME", "10"))
+
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
@@ -73,6 +100,102 @@ def get_password_hash(password: str) -> str:
     ).decode('utf-8')
 
 
+class PasswordHasher:
+    """
+    Esegue verify_password/get_password_hash su un pool di thread limitato.
+    Le richieste oltre la coda massima vengono rifiutate subito con 503.
+    """
+
+    def __init__(self, workers: int = BCRYPT_WORKERS, queue_max: int = BCRYPT_QUEUE_MAX):
+        self.workers = workers
+        self.queue_max = queue_max
+        self._executor: Optional[ThreadPoolExecutor] = None  # creato al primo uso (dopo l'eventuale fork)
+        self.pending = 0
+
+        # Metriche
+        self.completed = 0
+        self.rejected = 0
+
+    async def _run(self, fn: Callable, *args):
+        if self.pending >= self.workers + self.queue_max:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Troppe richieste di accesso, riprova tra poco",
+                headers={"Retry-After": "1"},
+            )
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher()
+
+
+class LoginThrottle:
+    """
+    Limite a finestra fissa sul numero di tentativi per chiave (IP o username).
+    check() va chiamato prima di bcrypt: oltre il limite risponde 429 senza hash.
+    """
+
+    def __init__(self, name: str, max_attempts: int, window_seconds: int = LOGIN_WINDOW_SECONDS):
+        self.max_attempts = max_attempts
+        self.window_seconds = window_seconds
+        self._attempts = TTLStore(name, window_seconds, maxsize=100000)  # chiave -> (tentativi, fine finestra)
+        self._lock = Lock()
+        self.rejected = 0
+
+    def check(self, key: str) -> None:
+        item = self._attempts.get(key)
+        if item is not None and item[0] >= self.max_attempts:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Troppi tentativi di accesso, riprova più tardi",
+                headers={"Retry-After": str(max(1, int(item[1] - time.monotonic())))},
+            )
+
+    def hit(self, key: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            item = self._attempts.get(key)
+            if item is None:
+                self._attempts.set(key, (1, now + self.window_seconds))
+            else:
+                self._attempts.set(key, (item[0] + 1, item[1]), ttl=item[1] - now)
+
+    def reset(self, key: str) -> None:
+        self._attempts.pop(key)
+
+    def stats(self) -> dict:
+        return {"keys": len(self._attempts), "rejected": self.rejected}
+
+
+login_ip_throttle = LoginThrottle("login_ip", LOGIN_MAX_ATTEMPTS_PER_IP)
+login_username_throttle = LoginThrottle("login_username", LOGIN_MAX_FAILURES_PER_USERNAME)
+
+
 # JWT utilities
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
@@ -90,7 +213,12 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 
 def decode_token(token: str) -> Optional[TokenData]:
-    """Decode and validate a JWT token"""
+    """Decode and validate a JWT token (cached by token hash until it expires)"""
+    token_hash = hashlib.sha256(token.encode("utf-8")).digest()
+    token_data = token_cache.get(token_hash)
+    if token_data is not None:
+        return token_data
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id_str = payload.get("sub")
@@ -100,51 +228,64 @@ def decode_token(token: str) -> Optional[TokenData]:
 
         # Convert string to int
         user_id = int(user_id_str)
-        return TokenData(user_id=user_id)
+        token_data = TokenData(user_id=user_id)
     except (JWTError, ValueError):
         return None
 
+    # Senza exp il token resta in cache per la durata standard
+    expires_at = payload.get("exp")
+    ttl = expires_at - time.time() if isinstance(expires_at, (int, float)) else None
+    token_cache.set(token_hash, token_data, ttl)
+    return token_data
+
 
 # User utilities
-def get_user_by_username(db: Session, username: str) -> Optional[User]:
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
     """Get user by username"""
-    return db.query(User).filter(User.username == username).first()
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalars().first()
 
 
-def get_user_by_email(db: Session, email: str) -> Optional[User]:
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
     """Get user by email"""
-    return db.query(User).filter(User.email == email).first()
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
 
 
-def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
+async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
     """Get user by ID"""
-    return db.query(User).filter(User.id == user_id).first()
+    return await db.get(User, user_id)
+
 
+def invalidate_user(user_id: int) -> None:
+    """Da chiamare dopo ogni modifica (o eliminazione) di un utente"""
+    user_cache.pop(user_id)
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
+
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[User]:
     """Authenticate user by username/email and password"""
     # Normalize username/email to lowercase
     username_lower = username.lower().strip()
 
     # Try username first
-    user = get_user_by_username(db, username_lower)
+    user = await get_user_by_username(db, username_lower)
 
     # If not found, try email
     if not user:
-        user = get_user_by_email(db, username_lower)
+        user = await get_user_by_email(db, username_lower)
 
     if not user:
         return None
 
-    if not verify_password(password, user.password_hash):
+    if not await password_hasher.verify(password, user.password_hash):
         return None
 
     return user
 
 
-def create_user(db: Session, user_data: UserCreate) -> User:
+async def create_user(db: AsyncSession, user_data: UserCreate) -> User:
     """Create a new user"""
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
 
     email_to_use = user_data.email
     if not email_to_use:
@@ -157,8 +298,8 @@ def create_user(db: Session, user_data: UserCreate) -> User:
     )
 
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
 
     return db_user
 
@@ -166,9 +307,14 @@ def create_user(db: Session, user_data: UserCreate) -> User:
 # Dependency to get current user
 async def get_current_user(
     token: Optional[str] = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ) -> Optional[User]:
-    """Get current authenticated user from JWT token"""
+    """
+    Get current authenticated user from JWT token.
+    The returned user comes from the user cache (shared between requests) or
+    the async read-only session: routes that modify it must load it again in
+    their own session and then call invalidate_user().
+    """
     if not token:
         return None
 
@@ -177,11 +323,24 @@ async def get_current_user(
     if token_data is None or token_data.user_id is None:
         return None
 
-    user = get_user_by_id(db, token_data.user_id)
+    user = user_cache.get(token_data.user_id)
+    if user is None:
+        user = await get_user_by_id(db, token_data.user_id)
+        if user is not None:
+            user_cache.set(user.id, user)
 
     return user
 
 
+async def get_current_user_unscoped(token: Optional[str] = Depends(oauth2_scheme)) -> Optional[User]:
+    """
+    Like get_current_user, but with its own session closed before returning:
+    for long-lived responses (SSE) that must not hold a pooled connection.
+    """
+    async with AsyncReadSessionLocal() as db:
+        return await get_current_user(token, db)
+
+
 async def get_current_user_required(
     current_user: Optional[User] = Depends(get_current_user)
 ) -> User:
@@ -0,0 +1,211 @@
+"""
+Avatar storage for Hot and Cold Game
+Images are stored once per content hash, in several sizes and formats, and
+served with immutable cache headers (a new image always gets a new URL).
+Files no user references any more are removed by a periodic sweep.
+"""
+
+import os
+import io
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import BinaryIO, List, Optional, Set
+
+from PIL import Image
+from starlette.staticfiles import StaticFiles
+
+from database import SessionLocal, User
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = "uploads"
+AVATAR_DIR = os.path.join(UPLOAD_DIR, "avatars")
+AVATAR_URL_PREFIX = "/uploads/avatars/"
+
+# Varianti generate a ogni upload: {hash}_{lato}.{formato}; avatar_path punta alla 200 JPEG
+AVATAR_SIZES = (200, 96, 48)
+AVATAR_FORMATS = {
+    "jpg": ("JPEG", {"quality": 85}),
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Pulizia dei file non più usati: ogni quanto e da quanto un file deve essere fermo
+# (copre l'intervallo tra la scrittura delle varianti e il commit dell'upload)
+AVATAR_SWEEP_INTERVAL_SECONDS = int(os.getenv("AVATAR_SWEEP_INTERVAL_SECONDS", "3600"))
+AVATAR_SWEEP_GRACE_SECONDS = int(os.getenv("AVATAR_SWEEP_GRACE_SECONDS", "3600"))
+
+
+def load_square(image: BinaryIO, side: int = AVATAR_SIZES[0]) -> Image.Image:
+    """Decode the image (JPEG already reduced) and center-crop it to side x side"""
+    img = Image.open(image)
+
+    # JPEG: decodifica già ridotta (1/2, 1/4, 1/8) alla scala più piccola che copre il lato
+    img.draft("RGB", (side, side))
+
+    # Convert to RGB if necessary (PNG with transparency, palette, grayscale, CMYK)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+
+    # Use the larger ratio to ensure image fills the target size
+    width, height = img.size
+    ratio = max(side / width, side / height)
+    new_width = max(side, round(width * ratio))
+    new_height = max(side, round(height * ratio))
+
+    # reducing_gap: prima una riduzione intera veloce (reduce), poi LANCZOS sul resto
+    img = img.resize((new_width, new_height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+    # Center crop
+    left = (new_width - side) // 2
+    top = (new_height - side) // 2
+    return img.crop((left, top, left + side, top + side))
+
+
+def variant_name(digest: str, size: int, ext: str) -> str:
+    return f"{digest}_{size}.{ext}"
+
+
+def store_avatar(image: BinaryIO) -> str:
+    """
+    Crea le varianti dell'immagine e ritorna l'avatar_path (200 px JPEG).
+    Il nome dipende dai pixel: la stessa immagine caricata due volte (anche da
+    utenti diversi) riusa i file già scritti.
+    """
+    square = load_square(image)
+    digest = hashlib.sha256(square.tobytes()).hexdigest()[:24]
+    avatar_path = AVATAR_URL_PREFIX + variant_name(digest, AVATAR_SIZES[0], "jpg")
+
+    if os.path.exists(os.path.join(AVATAR_DIR, variant_name(digest, AVATAR_SIZES[0], "jpg"))):
+        # File già presenti (magari non più usati): rinnovati, così la pulizia non
+        # li elimina prima del commit; se ne manca qualcuno vengono riscritti
+        try:
+            for path in avatar_files(avatar_path):
+                os.utime(path)
+            return avatar_path
+        except OSError:
+            pass
+
+    os.makedirs(AVATAR_DIR, exist_ok=True)
+
+    # La 200 JPEG indica che le varianti esistono (dedup sopra): va scritta per ultima,
+    # così un crash o un upload concorrente non la vedono senza le altre
+    variants = [(size, ext) for size in AVATAR_SIZES for ext in AVATAR_FORMATS]
+    marker = (AVATAR_SIZES[0], "jpg")
+    variants.remove(marker)
+    variants.append(marker)
+
+    resized = {}
+    for size, ext in variants:
+        if size not in resized:
+            resized[size] = square if size == square.width else square.resize((size, size), Image.Resampling.LANCZOS)
+        file_format, options = AVATAR_FORMATS[ext]
+        output = io.BytesIO()
+        resized[size].save(output, format=file_format, **options)
+
+        # Scrittura atomica: upload concorrenti della stessa immagine non vedono file a metà
+        path = os.path.join(AVATAR_DIR, variant_name(digest, size, ext))
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(output.getvalue())
+        os.replace(tmp_path, path)
+
+    return avatar_path
+
+
+def avatar_files(avatar_path: str) -> List[str]:
+    """File su disco di un avatar_path (tutte le varianti, o il vecchio file singolo)"""
+    if avatar_path.startswith(AVATAR_URL_PREFIX):
+        digest = os.path.basename(avatar_path).split("_")[0]
+        return [
+            os.path.join(AVATAR_DIR, variant_name(digest, size, ext))
+            for size in AVATAR_SIZES
+            for ext in AVATAR_FORMATS
+        ]
+    return [avatar_path.lstrip("/")]
+
+
+def sweep_avatars(grace_seconds: int = AVATAR_SWEEP_GRACE_SECONDS) -> int:
+    """
+    Elimina i file degli avatar che nessun utente usa, fermi da più di
+    `grace_seconds`. Le richieste non cancellano mai file: un upload concorrente
+    della stessa immagine (stesso nome) non può perdere le sue varianti.
+    Ritorna il numero di file eliminati.
+    """
+    if not os.path.isdir(AVATAR_DIR):
+        return 0
+
+    # Elenco dei file prima della lettura degli utenti: un file scritto dopo è
+    # comunque più recente del periodo di grazia
+    names = os.listdir(AVATAR_DIR)
+    with SessionLocal() as db:
+        in_use = {path for (path,) in db.query(User.avatar_path).filter(User.avatar_path.isnot(None))}
+    keep: Set[str] = {os.path.basename(f) for avatar_path in in_use for f in avatar_files(avatar_path)}
+
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    for name in names:
+        if name in keep:
+            continue
+        path = os.path.join(AVATAR_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass  # Rimosso nel frattempo (altro worker)
+    return removed
+
+
+class AvatarSweeper:
+    """Task di background che elimina periodicamente gli avatar non più usati"""
+
+    def __init__(self, interval_seconds: int = AVATAR_SWEEP_INTERVAL_SECONDS):
+        self.interval = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.removed = 0
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                removed = await asyncio.to_thread(sweep_avatars)
+                self.removed += removed
+                if removed:
+                    logger.info(f"🧹 Avatar: eliminati {removed} file non più usati")
+            except Exception as e:
+                logger.error(f"❌ Errore pulizia avatar: {e}")
+
+    def start(self) -> None:
+        """Avvia la pulizia periodica (da chiamare nello startup dell'app)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+avatar_sweeper = AvatarSweeper()
+
+
+class AvatarStaticFiles(StaticFiles):
+    """
+    StaticFiles per /uploads: ETag e Last-Modified come di consueto, più
+    Cache-Control immutable per le varianti con hash nel nome
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if os.path.basename(os.path.dirname(full_path)) == "avatars":
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
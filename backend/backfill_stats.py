@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ricalcola gli aggregati user_stats dalle sessioni di gioco concluse
+(GET /api/game/stats legge solo user_stats)
+
+Uso:
+  python backfill_stats.py            # tutti gli utenti
+  python backfill_stats.py <user_id>  # un solo utente
+"""
+
+import sys
+import time
+
+from database import Base, SessionLocal, engine
+from user_stats import rebuild_user_stats
+
+
+if __name__ == "__main__":
+    user_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
+    Base.metadata.create_all(bind=engine)
+
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        rows = rebuild_user_stats(db, user_id)
+        db.commit()
+
+    target = f"utente {user_id}" if user_id is not None else "tutti gli utenti"
+    print(f"✅ user_stats ricalcolata per {target}: {rows} righe in {time.perf_counter() - start:.2f}s")
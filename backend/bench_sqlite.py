@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark SQLite: profilo "default" contro "production" (WAL + pragma)
+Simula il carico di /api/game/progress (scritture) e delle GET (letture)
+su un database temporaneo, con scrittori e lettori concorrenti.
+
+Uso:
+  python bench_sqlite.py [secondi] [scrittori] [lettori]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, User, GameSession, make_engine
+
+GAME_DATE = "2025-11-20"
+USERS = 500
+
+
+def setup_database(path: str) -> None:
+    engine = make_engine(path, profile="default")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add_all([User(username=f"user{i}", password_hash="x") for i in range(USERS)])
+        db.commit()
+    engine.dispose()
+
+
+def writer(Session, stop: threading.Event, counter: list) -> None:
+    """Stesso pattern di update_progress: SELECT + INSERT/UPDATE + commit"""
+    while not stop.is_set():
+        user_id = random.randint(1, USERS)
+        with Session() as db:
+            session = db.query(GameSession).filter(
+                GameSession.user_id == user_id,
+                GameSession.game_date == GAME_DATE,
+                GameSession.game_mode == "daily"
+            ).first()
+            if session:
+                session.attempts += 1
+            else:
+                db.add(GameSession(user_id=user_id, game_date=GAME_DATE, attempts=1))
+            db.commit()
+        counter[0] += 1
+
+
+def reader(Session, stop: threading.Event, counter: list) -> None:
+    """Stesso pattern di GET /api/game/players/{date}"""
+    while not stop.is_set():
+        with Session() as db:
+            db.query(GameSession, User).join(User).filter(
+                GameSession.game_date == GAME_DATE,
+                GameSession.game_mode == "daily"
+            ).all()
+        counter[0] += 1
+
+
+def run_profile(profile: str, seconds: float, writers: int, readers: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_sqlite_"), "bench.db")
+    setup_database(path)
+
+    write_engine = make_engine(path, profile=profile)
+    read_engine = make_engine(path, profile=profile, read_only=(profile == "production"))
+    WriteSession = sessionmaker(bind=write_engine)
+    ReadSession = sessionmaker(bind=read_engine)
+
+    stop = threading.Event()
+    writes, reads = [0], [0]
+    errors = []
+
+    def guarded(target, *args):
+        try:
+            target(*args)
+        except Exception as e:  # "database is locked" nel profilo default
+            errors.append(e)
+
+    threads = [threading.Thread(target=guarded, args=(writer, WriteSession, stop, writes)) for _ in range(writers)]
+    threads += [threading.Thread(target=guarded, args=(reader, ReadSession, stop, reads)) for _ in range(readers)]
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    write_engine.dispose()
+    read_engine.dispose()
+
+    return {
+        "writes_per_sec": writes[0] / elapsed,
+        "reads_per_sec": reads[0] / elapsed,
+        "errors": len(errors),
+    }
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    writers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    readers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+    print(f"⏱️  {seconds}s per profilo, {writers} scrittori, {readers} lettori "
+          f"({datetime.now(timezone.utc).isoformat(timespec='seconds')})\n")
+
+    results = {}
+    for profile in ("default", "production"):
+        results[profile] = run_profile(profile, seconds, writers, readers)
+        r = results[profile]
+        print(f"{profile:>10}: {r['writes_per_sec']:8.1f} scritture/s  "
+              f"{r['reads_per_sec']:8.1f} letture/s  errori: {r['errors']}")
+
+    before, after = results["default"], results["production"]
+    if before["writes_per_sec"] and before["reads_per_sec"]:
+        print(f"\n📈 Scritture x{after['writes_per_sec'] / before['writes_per_sec']:.1f}, "
+              f"letture x{after['reads_per_sec'] / before['reads_per_sec']:.1f}")
@@ -3,23 +3,107 @@ Database configuration and models for Hot and Cold Game
 Uses SQLite with SQLAlchemy
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Enum, Float, Boolean
+from sqlalchemy import create_engine, event, text, Column, Integer, String, DateTime, ForeignKey, Enum, Float, Boolean, Index
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime, timezone
 import enum
+import logging
+import os
 
-# Database URL - SQLite file
-DATABASE_URL = "sqlite:///./hotncold.db"
+logger = logging.getLogger(__name__)
 
-# Create engine
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False}  # Needed for SQLite
-)
+# Database file - SQLite
+DATABASE_PATH = os.getenv("DATABASE_PATH", "./hotncold.db")
+DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
+
+# "production": WAL + pragma ottimizzate; "default": journaling standard di SQLite
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "production")
+
+# Pragma applicate a ogni nuova connessione nel profilo production
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",          # lettori e scrittore non si bloccano a vicenda
+    "synchronous": "NORMAL",        # fsync solo ai checkpoint (sicuro con WAL)
+    "busy_timeout": 5000,           # ms di attesa sul lock invece di errore immediato
+    "cache_size": -20000,           # ~20 MB di page cache per connessione
+    "mmap_size": 268435456,         # 256 MB letti via mmap
+    "temp_store": "MEMORY",
+}
+
+
+def _apply_pragmas(engine, read_only: bool = False):
+    """Registra le pragma del profilo production sulle nuove connessioni"""
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            # journal_mode è persistente nel file: lo imposta solo lo scrittore
+            if read_only and name == "journal_mode":
+                continue
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+def _sqlite_url(driver: str, path: str, read_only: bool) -> str:
+    if read_only:
+        return f"{driver}:///file:{path}?mode=ro&uri=true"
+    return f"{driver}:///{path}"
+
+
+def _engine_options(profile: str, read_only: bool) -> dict:
+    if profile != "production":
+        return {"connect_args": {"check_same_thread": False}}  # Needed for SQLite
+
+    return {
+        "connect_args": {"check_same_thread": False, "timeout": 5},
+        "pool_size": 10 if read_only else 5,
+        "max_overflow": 20 if read_only else 5,
+        "pool_recycle": 3600,
+    }
+
+
+def make_engine(path: str = DATABASE_PATH, profile: str = SQLITE_PROFILE, read_only: bool = False):
+    """
+    Crea un engine SQLite per il profilo richiesto.
+    read_only apre il file in sola lettura (pool separato per le route GET).
+    """
+    engine = create_engine(_sqlite_url("sqlite", path, read_only), **_engine_options(profile, read_only))
+    if profile == "production":
+        _apply_pragmas(engine, read_only=read_only)
+    return engine
+
+
+def make_async_engine(path: str = DATABASE_PATH, profile: str = SQLITE_PROFILE, read_only: bool = False):
+    """Come make_engine, ma asyncio (aiosqlite): le query non bloccano l'event loop"""
+    engine = create_async_engine(
+        _sqlite_url("sqlite+aiosqlite", path, read_only),
+        **_engine_options(profile, read_only)
+    )
+    if profile == "production":
+        _apply_pragmas(engine.sync_engine, read_only=read_only)
+    return engine
+
+
+# Create engines: uno per le scritture, uno in sola lettura per le GET
+engine = make_engine()
+read_engine = make_engine(read_only=True)
+
+# Engine asyncio per le route più frequenti
+async_engine = make_async_engine()
+async_read_engine = make_async_engine(read_only=True)
 
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# expire_on_commit=False: gli oggetti restano leggibili dopo il commit senza altre query
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
@@ -59,6 +143,11 @@ class User(Base):
 class Friendship(Base):
     """Friendship model for friend requests and connections"""
     __tablename__ = "friendships"
+    __table_args__ = (
+        # Indici coprenti per le amicizie di un utente nelle due direzioni (lista amici, is_friend)
+        Index("ix_friendships_user_status", "user_id", "status", "friend_id"),
+        Index("ix_friendships_friend_status", "friend_id", "status", "user_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -74,6 +163,10 @@ class Friendship(Base):
 class GameSession(Base):
     """Game session model for tracking player progress"""
     __tablename__ = "game_sessions"
+    __table_args__ = (
+        # Una sola sessione per utente/data/modalità: supporta anche l'upsert di update_progress
+        Index("ux_game_sessions_user_date_mode", "user_id", "game_date", "game_mode", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -91,9 +184,166 @@ class GameSession(Base):
     user = relationship("User", back_populates="game_sessions")
 
 
+class UserStats(Base):
+    """
+    Aggregati delle partite per utente e modalità, aggiornati quando una partita
+    inizia (games_played) e quando si conclude (game_mode "all" = tutte le modalità)
+    """
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    game_mode = Column(String(20), primary_key=True)
+    games_played = Column(Integer, default=0, nullable=False)
+    games_won = Column(Integer, default=0, nullable=False)
+    won_attempts = Column(Integer, default=0, nullable=False)  # somma dei tentativi delle vinte (media)
+    total_hints = Column(Integer, default=0, nullable=False)
+    current_streak = Column(Integer, default=0, nullable=False)  # giorni consecutivi vinti fino a last_won_date
+    best_streak = Column(Integer, default=0, nullable=False)
+    last_played_date = Column(String(10), nullable=True)  # YYYY-MM-DD
+    last_won_date = Column(String(10), nullable=True)  # YYYY-MM-DD, ultimo giorno con almeno una vittoria
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
 def init_db():
-    """Create all tables"""
+    """Create all tables and migrate existing database files"""
     Base.metadata.create_all(bind=engine)
+    migrate_db()
+
+
+def migrate_db():
+    """
+    Porta un hotncold.db esistente allo schema attuale:
+    - aggiunge game_sessions.hints_used se manca
+    - deduplica le sessioni (user_id, game_date, game_mode) e crea l'indice univoco
+    - crea gli indici di friendships se mancano
+    - crea l'indice di ricerca degli username (FTS5 trigram) se manca
+    - calcola gli aggregati user_stats se la tabella è nuova
+    """
+    with engine.begin() as conn:
+        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(game_sessions)"))}
+        if "hints_used" not in columns:
+            conn.execute(text("ALTER TABLE game_sessions ADD COLUMN hints_used INTEGER DEFAULT 0"))
+
+        indexes = {row[1] for row in conn.execute(text("PRAGMA index_list(game_sessions)"))}
+        if "ux_game_sessions_user_date_mode" in indexes:
+            removed = None
+        else:
+            removed = deduplicate_game_sessions(conn)
+
+        # create_all non aggiunge indici a tabelle già esistenti
+        for index in Friendship.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+    if removed is not None:
+        logger.info(f"🔧 Migrazione game_sessions: {removed} sessioni duplicate rimosse, indice univoco creato")
+
+    create_user_search_index()
+
+    backfill_user_stats()
+
+
+def deduplicate_game_sessions(conn) -> int:
+    """Tiene una sola sessione per (utente, data, modalità) e crea l'indice univoco"""
+    conn.execute(text("UPDATE game_sessions SET game_mode = 'daily' WHERE game_mode IS NULL"))
+
+    # La riga tenuta eredita il massimo degli hint usati nel gruppo
+    conn.execute(text("""
+        UPDATE game_sessions SET hints_used = (
+            SELECT MAX(COALESCE(g.hints_used, 0)) FROM game_sessions g
+            WHERE g.user_id = game_sessions.user_id
+              AND g.game_date = game_sessions.game_date
+              AND g.game_mode = game_sessions.game_mode
+        )
+    """))
+
+    # Per ogni gruppo tiene la sessione più avanzata (vinta, completata, più tentativi, più recente)
+    removed = conn.execute(text("""
+        DELETE FROM game_sessions WHERE id NOT IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, game_date, game_mode
+                    ORDER BY won DESC, completed DESC, attempts DESC, id DESC
+                ) AS position
+                FROM game_sessions
+            ) WHERE position = 1
+        )
+    """)).rowcount
+
+    conn.execute(text(
+        "CREATE UNIQUE INDEX ux_game_sessions_user_date_mode "
+        "ON game_sessions (user_id, game_date, game_mode)"
+    ))
+
+    return removed
+
+
+def create_user_search_index():
+    """
+    Indice FTS5 trigram sugli username (tabella users_fts a contenuto esterno),
+    tenuto allineato a users dai trigger. Senza il tokenizer trigram
+    (SQLite < 3.34) la ricerca resta su LIKE.
+    """
+    with engine.begin() as conn:
+        if has_user_search_index(conn):
+            return
+
+        try:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE users_fts USING fts5("
+                "username, content='users', content_rowid='id', tokenize='trigram')"
+            ))
+        except OperationalError as e:
+            logger.warning(f"⚠️ FTS5 trigram non disponibile, ricerca utenti senza indice: {e}")
+            return
+
+        conn.execute(text("""
+            CREATE TRIGGER users_fts_insert AFTER INSERT ON users BEGIN
+                INSERT INTO users_fts(rowid, username) VALUES (new.id, new.username);
+            END
+        """))
+        conn.execute(text("""
+            CREATE TRIGGER users_fts_delete AFTER DELETE ON users BEGIN
+                INSERT INTO users_fts(users_fts, rowid, username) VALUES ('delete', old.id, old.username);
+            END
+        """))
+        conn.execute(text("""
+            CREATE TRIGGER users_fts_update AFTER UPDATE OF username ON users BEGIN
+                INSERT INTO users_fts(users_fts, rowid, username) VALUES ('delete', old.id, old.username);
+                INSERT INTO users_fts(rowid, username) VALUES (new.id, new.username);
+            END
+        """))
+        conn.execute(text("INSERT INTO users_fts(users_fts) VALUES ('rebuild')"))
+
+    logger.info("🔧 Migrazione users: indice di ricerca username (FTS5 trigram) creato")
+
+
+def has_user_search_index(conn) -> bool:
+    return conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'"
+    )).first() is not None
+
+
+def backfill_user_stats():
+    """Primo avvio con la tabella user_stats: la calcola dalle sessioni esistenti"""
+    from user_stats import rebuild_user_stats
+
+    with SessionLocal() as db:
+        if db.query(UserStats).first() is not None:
+            return
+        if db.query(GameSession).first() is None:
+            return
+        rows = rebuild_user_stats(db)
+        db.commit()
+
+    logger.info(f"🔧 Migrazione user_stats: {rows} aggregati calcolati dalle sessioni esistenti")
+
+
+def dispose_engines(close: bool = True):
+    """Chiude i pool di connessioni (close=False dopo un fork: non toccare quelle del padre)"""
+    engine.dispose(close=close)
+    read_engine.dispose(close=close)
+    async_engine.sync_engine.dispose(close=close)
+    async_read_engine.sync_engine.dispose(close=close)
 
 
 def get_db():
@@ -103,3 +353,24 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """Dependency to get a read-only database session (GET routes)"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    """Dependency to get an asyncio database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    """Dependency to get a read-only asyncio database session"""
+    async with AsyncReadSessionLocal() as db:
+        yield db
@@ -0,0 +1,212 @@
+"""
+Ranking engines for Hot and Cold Game
+Bulk vector computations (full rankings, nearest neighbours) either inline
+or in a small process pool that shares the vector matrix through shared memory.
+rank() is the awaitable version of compute_rankings for the request path.
+"""
+
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from threading import Lock
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# "inline" (nel processo API) oppure "process" (pool di processi separati)
+RANKING_ENGINE = os.getenv("RANKING_ENGINE", "inline")
+RANKING_PROCESSES = int(os.getenv("RANKING_PROCESSES", "2"))
+
+
+def rank_vectors(vectors: np.ndarray, norms: np.ndarray, secret_index: int) -> np.ndarray:
+    """
+    Rank di ogni parola rispetto a quella segreta, indicizzato come il vocabolario
+    (la parola segreta ha rank 0, la più vicina rank 1, come most_similar)
+    """
+    similarities = (vectors @ vectors[secret_index]) / norms
+    similarities[secret_index] = np.inf
+
+    order = np.argsort(-similarities)
+    ranks = np.empty(len(order), dtype=np.int32)
+    ranks[order] = np.arange(len(order), dtype=np.int32)
+    return ranks
+
+
+def nearest_vectors(
+    vectors: np.ndarray,
+    norms: np.ndarray,
+    secret_index: int,
+    topn: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Indici e similarità coseno delle topn parole più vicine (esclusa la segreta)"""
+    similarities = (vectors @ vectors[secret_index]) / (norms * norms[secret_index])
+    similarities[secret_index] = -np.inf
+
+    topn = min(topn, len(similarities) - 1)
+    best = np.argpartition(-similarities, topn)[:topn]
+    best = best[np.argsort(-similarities[best])]
+    return best, similarities[best]
+
+
+def save_rankings(path: str, ranks: np.ndarray) -> None:
+    """Scrittura atomica di un ranking .npy (file temporaneo + rename)"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, ranks)
+    os.replace(tmp_path, path)
+
+
+class InlineEngine:
+    """Calcoli nel processo corrente (comportamento di default)"""
+
+    name = "inline"
+    workers = 1
+
+    def __init__(self):
+        self.vectors = None
+        self.norms = None
+        self.jobs = 0
+
+    def start(self, vectors: np.ndarray, norms: np.ndarray) -> None:
+        self.vectors = vectors
+        self.norms = norms
+
+    def compute_rankings(self, secret_index: int, path: str) -> np.ndarray:
+        """Calcola, salva su disco e ritorna il ranking"""
+        ranks = rank_vectors(self.vectors, self.norms, secret_index)
+        save_rankings(path, ranks)
+        self.jobs += 1
+        return ranks
+
+    async def rank(self, secret_index: int, path: str) -> np.ndarray:
+        """Come compute_rankings, da una coroutine: il calcolo va in un thread"""
+        return await asyncio.to_thread(self.compute_rankings, secret_index, path)
+
+    def nearest(self, secret_index: int, topn: int) -> Tuple[np.ndarray, np.ndarray]:
+        self.jobs += 1
+        return nearest_vectors(self.vectors, self.norms, secret_index, topn)
+
+    def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "workers": self.workers, "jobs": self.jobs}
+
+
+# Stato dei processi del pool: matrice condivisa agganciata all'avvio
+_worker_shm = []
+_worker_vectors: Optional[np.ndarray] = None
+_worker_norms: Optional[np.ndarray] = None
+
+
+def _attach_shared(vectors_name: str, norms_name: str, shape: tuple, dtype: str) -> None:
+    """Initializer dei processi del pool: aggancia la matrice senza copiarla"""
+    global _worker_vectors, _worker_norms
+
+    vectors_shm = shared_memory.SharedMemory(name=vectors_name)
+    norms_shm = shared_memory.SharedMemory(name=norms_name)
+    _worker_shm.extend([vectors_shm, norms_shm])
+
+    _worker_vectors = np.ndarray(shape, dtype=dtype, buffer=vectors_shm.buf)
+    _worker_norms = np.ndarray((shape[0],), dtype=dtype, buffer=norms_shm.buf)
+
+
+def _rankings_job(secret_index: int, path: str) -> str:
+    save_rankings(path, rank_vectors(_worker_vectors, _worker_norms, secret_index))
+    return path
+
+
+def _nearest_job(secret_index: int, topn: int) -> Tuple[np.ndarray, np.ndarray]:
+    return nearest_vectors(_worker_vectors, _worker_norms, secret_index, topn)
+
+
+class ProcessPoolEngine(InlineEngine):
+    """
+    Calcoli in un pool di processi: niente GIL condiviso con le richieste HTTP.
+    La matrice viene copiata una volta in shared memory; i ranking calcolati
+    vengono scritti su disco dal worker e riletti in mmap (nessuna copia).
+    """
+
+    name = "process"
+
+    def __init__(self, workers: int = RANKING_PROCESSES):
+        super().__init__()
+        self.workers = workers
+        self._shm = []
+        self._init_args = None
+        self._executor = None
+        self._executor_pid = None
+        self._owner_pid = None
+        self._lock = Lock()
+
+    def start(self, vectors: np.ndarray, norms: np.ndarray) -> None:
+        super().start(vectors, norms)
+
+        shared = []
+        for array in (np.ascontiguousarray(vectors), np.ascontiguousarray(norms, dtype=vectors.dtype)):
+            shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+            shared.append(shm)
+
+        self._shm = shared
+        self._owner_pid = os.getpid()
+        self._init_args = (shared[0].name, shared[1].name, vectors.shape, vectors.dtype.str)
+        logger.info(f"🧮 Engine a processi: matrice {vectors.shape} in shared memory")
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Creato al primo uso e nel processo che lo usa (compatibile con prefork)
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_attach_shared,
+                    initargs=self._init_args
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def compute_rankings(self, secret_index: int, path: str) -> np.ndarray:
+        self._pool().submit(_rankings_job, secret_index, path).result()
+        self.jobs += 1
+        return np.load(path, mmap_mode="r")
+
+    async def rank(self, secret_index: int, path: str) -> np.ndarray:
+        """Attende il worker del pool senza bloccare l'event loop (né un thread)"""
+        await asyncio.wrap_future(self._pool().submit(_rankings_job, secret_index, path))
+        self.jobs += 1
+        return np.load(path, mmap_mode="r")
+
+    def nearest(self, secret_index: int, topn: int) -> Tuple[np.ndarray, np.ndarray]:
+        result = self._pool().submit(_nearest_job, secret_index, topn).result()
+        self.jobs += 1
+        return result
+
+    def shutdown(self) -> None:
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+        # La shared memory appartiene al processo che l'ha creata (il master in prefork)
+        if self._owner_pid != os.getpid():
+            return
+
+        for shm in self._shm:
+            shm.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self._shm = []
+
+
+def create_ranking_engine(backend: str = RANKING_ENGINE) -> InlineEngine:
+    """Crea l'engine configurato con RANKING_ENGINE"""
+    if backend == "process":
+        return ProcessPoolEngine()
+    return InlineEngine()
@@ -0,0 +1,96 @@
+"""
+Friend graph cache for Hot and Cold Game
+Accepted friendships as in-memory adjacency sets, loaded lazily per user and
+updated by the friends routes, so the leaderboard polls need no friendship query.
+The time of the last change of every user's friends lets the leaderboard
+deltas fall back to the full board when is_friend may be stale.
+"""
+
+import os
+import sys
+import time
+from typing import Awaitable, Callable, FrozenSet, Hashable, Optional
+
+from state_store import TTLStore
+
+# Un worker non vede le modifiche fatte dagli altri: la scadenza limita quanto
+# a lungo una lista di amici può restare vecchia
+FRIEND_GRAPH_TTL_SECONDS = int(os.getenv("FRIEND_GRAPH_TTL_SECONDS", "300"))
+FRIEND_GRAPH_MAX_USERS = int(os.getenv("FRIEND_GRAPH_MAX_USERS", "50000"))
+# Per quanto si ricorda l'ultima modifica degli amici di un utente (cursori ?since= più
+# vecchi con amici cambiati nel frattempo non sono distinguibili da quelli senza modifiche)
+FRIEND_CHANGES_TTL_SECONDS = int(os.getenv("FRIEND_CHANGES_TTL_SECONDS", "172800"))
+
+
+def _sizeof(user_id: Hashable, friend_ids: FrozenSet[int]) -> int:
+    return sys.getsizeof(user_id) + sys.getsizeof(friend_ids) + 28 * len(friend_ids)
+
+
+class FriendGraph:
+    """
+    Amici (amicizie accettate) per utente.
+    Gli insiemi sono frozenset sostituiti a ogni modifica: chi li ha letti può
+    continuare a usarli senza lock.
+    """
+
+    def __init__(self, ttl_seconds: int = FRIEND_GRAPH_TTL_SECONDS, max_users: int = FRIEND_GRAPH_MAX_USERS):
+        self._friends = TTLStore("friend_graph", ttl_seconds, max_users, sizeof=_sizeof)
+        self._changed_at = TTLStore("friend_changes", FRIEND_CHANGES_TTL_SECONDS, max_users)
+        self.hits = 0
+        self.loads = 0
+
+        # Chiamata con i due utenti a ogni amicizia aggiunta o rimossa
+        # (gli stream live dei due ricalcolano is_friend)
+        self.on_change: Optional[Callable[[int, int], None]] = None
+
+    async def get(self, user_id: int, load: Callable[[int], Awaitable[set]]) -> FrozenSet[int]:
+        """Amici di user_id; al primo accesso (o dopo la scadenza) li legge con load(user_id)"""
+        friend_ids = self._friends.get(user_id)
+        if friend_ids is not None:
+            self.hits += 1
+            return friend_ids
+
+        friend_ids = frozenset(await load(user_id))
+        self._friends.set(user_id, friend_ids)
+        self.loads += 1
+        return friend_ids
+
+    def changed_at(self, user_id: int) -> float:
+        """Ora (time.time()) dell'ultima modifica degli amici di user_id, 0 se non nota"""
+        return self._changed_at.get(user_id) or 0.0
+
+    def add(self, user_id: int, friend_id: int) -> None:
+        """Amicizia accettata: aggiorna i due utenti se sono in cache"""
+        now = time.time()
+        for a, b in ((user_id, friend_id), (friend_id, user_id)):
+            self._changed_at.set(a, now)
+            friend_ids = self._friends.get(a)
+            if friend_ids is not None:
+                self._friends.set(a, friend_ids | {b})
+        if self.on_change is not None:
+            self.on_change(user_id, friend_id)
+
+    def remove(self, user_id: int, friend_id: int) -> None:
+        """Amicizia rimossa: aggiorna i due utenti se sono in cache"""
+        now = time.time()
+        for a, b in ((user_id, friend_id), (friend_id, user_id)):
+            self._changed_at.set(a, now)
+            friend_ids = self._friends.get(a)
+            if friend_ids is not None and b in friend_ids:
+                self._friends.set(a, friend_ids - {b})
+        if self.on_change is not None:
+            self.on_change(user_id, friend_id)
+
+    def forget(self, user_id: int) -> None:
+        """Account eliminato: toglie l'utente dalla cache e da ogni lista di amici (operazione rara)"""
+        self._friends.pop(user_id)
+        self._changed_at.pop(user_id)
+        for other_id, friend_ids in self._friends.items():
+            if user_id in friend_ids:
+                self.remove(other_id, user_id)
+
+    def stats(self) -> dict:
+        return {"users": len(self._friends), "hits": self.hits, "loads": self.loads}
+
+
+friend_graph = FriendGraph()
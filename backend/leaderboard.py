@@ -0,0 +1,298 @@
+"""
+Incremental leaderboards for Hot and Cold Game
+One sorted board per (date, mode), updated on every progress write and read
+as pre-serialized JSON by the progress bar polls.
+Every change bumps the board version, so polls can ask only for what changed.
+"""
+
+import sys
+import json
+import time
+import asyncio
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sortedcontainers import SortedList
+
+SortKey = Tuple[bool, int, int]  # (not won, best_rank, user_id): vincitori e rank migliori prima
+
+# Versioni ricordate per le richieste ?since= (oltre, il client riceve la lista completa)
+CHANGELOG_MIN_SIZE = 256
+
+# Valore di un giocatore rimosso (account eliminato) nello stato condiviso
+REMOVED = "null"
+
+# Campi di PlayerProgress, nello stesso ordine della risposta
+ENTRY_FIELDS = ("user_id", "username", "avatar_path", "best_rank", "attempts", "completed", "won")
+
+
+def _dumps(data) -> bytes:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class Leaderboard:
+    """
+    Classifica ordinata dei giocatori di una partita.
+    Le chiavi di ordinamento stanno in una SortedList (inserimento e rimozione
+    O(log n)); ogni giocatore ha il suo frammento JSON già serializzato.
+    Lo snapshot (tutti come non amici) è condiviso: per chi ha amici in classifica
+    si sostituiscono solo i frammenti degli amici, alle posizioni registrate.
+    """
+
+    def __init__(self, version: Optional[int] = None):
+        self._keys: SortedList = SortedList()  # di SortKey
+        self._entries: Dict[int, dict] = {}
+        self._sort_keys: Dict[int, SortKey] = {}
+        self._fragments: Dict[int, Tuple[bytes, bytes]] = {}  # (non amico, amico)
+        self._snapshot: Optional[bytes] = None
+        self._offsets: Dict[int, Tuple[int, int]] = {}  # user_id -> (inizio, fine) nello snapshot
+        self.ready = asyncio.Event()  # impostato dopo il primo caricamento dal DB
+
+        # Versione monotona: _changelog[i] è l'utente cambiato alla versione _log_versions[i]
+        # (raggiunta all'ora _log_times[i]).
+        # Di default parte dall'ora corrente in ms, così i cursori di prima di un riavvio
+        # risultano vecchi e il client riceve la lista completa; con uno stato condiviso
+        # la versione è quella dello store (uguale per tutti i worker)
+        self.version = int(time.time() * 1000) if version is None else version
+        self._changelog: List[int] = []
+        self._log_versions: List[int] = []
+        self._log_times: List[float] = []
+        self._log_base = self.version  # cursori più vecchi di così: lista completa
+        self._log_base_time = time.time()
+        self._removed: Dict[int, int] = {}  # user_id -> versione della rimozione
+        # Lettori che hanno ricevuto la lista completa per amici cambiati: (versione, ora)
+        self._friends_served: Dict[int, Tuple[int, float]] = {}
+
+        # Stato condiviso: ultimo JSON applicato per giocatore e ultimo allineamento
+        self._raw: Dict[int, str] = {}
+        self.synced_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._entries
+
+    def get(self, user_id: int) -> Optional[dict]:
+        return self._entries.get(user_id)
+
+    def upsert(self, entry: dict, version: Optional[int] = None) -> None:
+        """
+        Inserisce o aggiorna un giocatore mantenendo l'ordine.
+        Senza `version` la versione della classifica avanza di uno.
+        """
+        user_id = entry["user_id"]
+
+        old_key = self._sort_keys.get(user_id)
+        if old_key is not None:
+            self._keys.remove(old_key)
+
+        key = (not entry["won"], entry["best_rank"], user_id)
+        self._keys.add(key)
+        self._sort_keys[user_id] = key
+        self._entries[user_id] = entry
+
+        data = {field: entry[field] for field in ENTRY_FIELDS}
+        hints = entry.get("hints_used", 0)
+        self._fragments[user_id] = (
+            _dumps({**data, "is_friend": False, "hints_used": hints}),
+            _dumps({**data, "is_friend": True, "hints_used": hints}),
+        )
+        self._removed.pop(user_id, None)
+        self._changed(user_id, version)
+
+    def remove(self, user_id: int, version: Optional[int] = None) -> None:
+        """Toglie un giocatore (riportato in "removed" alle richieste ?since=)"""
+        key = self._sort_keys.pop(user_id, None)
+        if key is None:
+            return
+        self._keys.remove(key)
+        self._entries.pop(user_id, None)
+        self._fragments.pop(user_id, None)
+        self._raw.pop(user_id, None)
+        self._changed(user_id, version)
+        self._removed[user_id] = self.version
+
+    def apply(self, entries: Dict[int, str], version: int) -> int:
+        """
+        Allinea la classifica a uno snapshot dello stato condiviso
+        (user_id -> entry in JSON, o REMOVED): i giocatori cambiati vengono
+        registrati tutti alla versione `version`. Ritorna quanti giocatori sono cambiati.
+        """
+        changed = 0
+        for user_id, raw in entries.items():
+            if raw == REMOVED:
+                if user_id in self:
+                    self.remove(user_id, version)
+                    changed += 1
+            elif self._raw.get(user_id) != raw:
+                self.upsert(json.loads(raw), version)
+                self._raw[user_id] = raw
+                changed += 1
+        self.version = max(self.version, version)
+        return changed
+
+    def reset_log(self) -> None:
+        """Svuota il log: tutti i cursori precedenti ricevono la lista completa"""
+        self._log_base_time = self.reached_at(self.version)
+        self._changelog.clear()
+        self._log_versions.clear()
+        self._log_times.clear()
+        self._removed.clear()
+        self._friends_served.clear()
+        self._log_base = self.version
+
+    def _changed(self, user_id: int, version: Optional[int] = None) -> None:
+        self._snapshot = None
+        self.version = self.version + 1 if version is None else max(self.version, version)
+        self._changelog.append(user_id)
+        self._log_versions.append(self.version)
+        self._log_times.append(time.time())
+
+        # Compattazione: il log resta proporzionale al numero di giocatori
+        limit = max(CHANGELOG_MIN_SIZE, 2 * len(self._entries))
+        if len(self._changelog) > limit:
+            drop = len(self._changelog) - limit // 2
+            self._log_base = self._log_versions[drop - 1]
+            self._log_base_time = self._log_times[drop - 1]
+            del self._changelog[:drop]
+            del self._log_versions[:drop]
+            del self._log_times[:drop]
+            self._removed = {uid: v for uid, v in self._removed.items() if v > self._log_base}
+            self._friends_served = {
+                uid: served for uid, served in self._friends_served.items() if served[0] >= self._log_base
+            }
+
+    def changed_since(self, since: int) -> Optional[Set[int]]:
+        """
+        Utenti cambiati dopo la versione `since`, o None se quella versione
+        non è più (o non è mai stata) nel log: serve la lista completa
+        """
+        if since < self._log_base or since > self.version:
+            return None
+        return set(self._changelog[bisect_right(self._log_versions, since):])
+
+    def reached_at(self, version: int) -> float:
+        """
+        Ora (time.time()) in cui la classifica è arrivata a `version`, 0 se non è
+        nel log. Per una versione raggiunta senza giocatori cambiati (allineamento
+        allo store) è l'ora della modifica precedente: mai più tardi del vero
+        """
+        if version < self._log_base or version > self.version:
+            return 0.0
+        index = bisect_right(self._log_versions, version)
+        return self._log_times[index - 1] if index else self._log_base_time
+
+    def friends_changed(self, viewer_id: int, since: int, changed_at: float) -> bool:
+        """
+        Amici del lettore cambiati (all'ora `changed_at`) dopo che ha ricevuto la
+        versione `since`: la sua risposta ?since= deve essere la lista completa
+        """
+        if changed_at <= self.reached_at(since):
+            return False
+        served = self._friends_served.get(viewer_id)
+        return served is None or served[0] != since or served[1] < changed_at
+
+    def friends_served(self, viewer_id: int) -> None:
+        """Lista completa inviata al lettore alla versione attuale (dopo friends_changed)"""
+        self._friends_served[viewer_id] = (self.version, time.time())
+
+    def memory_bytes(self) -> int:
+        """Stima della memoria occupata (frammenti JSON, entry e indici)"""
+        fragments = sum(len(a) + len(b) for a, b in self._fragments.values())
+        entries = sum(sys.getsizeof(entry) for entry in self._entries.values())
+        containers = sum(sys.getsizeof(c) for c in (
+            self._entries, self._sort_keys, self._fragments, self._offsets,
+            self._changelog, self._log_versions, self._log_times, self._removed, self._friends_served
+        )) + sum(sys.getsizeof(sublist) for sublist in self._keys._lists)
+        return fragments + entries + containers + len(self._snapshot or b"")
+
+    def _join(self, user_ids: Iterable[int], friend_ids: Set[int]) -> bytes:
+        fragments = self._fragments
+        return b"[" + b",".join(
+            fragments[user_id][user_id in friend_ids] for user_id in user_ids
+        ) + b"]"
+
+    def _shared_snapshot(self) -> bytes:
+        """Classifica intera con tutti i giocatori come non amici (e posizione di ognuno)"""
+        if self._snapshot is None:
+            parts = []
+            offsets = {}
+            position = 1  # dopo "["
+            for key in self._keys:
+                fragment = self._fragments[key[2]][False]
+                offsets[key[2]] = (position, position + len(fragment))
+                parts.append(fragment)
+                position += len(fragment) + 1  # più la virgola
+            self._snapshot = b"[" + b",".join(parts) + b"]"
+            self._offsets = offsets
+        return self._snapshot
+
+    def _with_friends(self, friend_ids: Set[int]) -> bytes:
+        """Snapshot condiviso con i soli frammenti degli amici sostituiti"""
+        snapshot = self._shared_snapshot()
+        spans = sorted(
+            (self._offsets[uid], uid) for uid in friend_ids if uid in self._offsets
+        )
+        if not spans:
+            return snapshot
+        parts = []
+        position = 0
+        for (start, end), uid in spans:
+            parts.append(snapshot[position:start])
+            parts.append(self._fragments[uid][True])
+            position = end
+        parts.append(snapshot[position:])
+        return b"".join(parts)
+
+    def render(
+        self,
+        friend_ids: Optional[Set[int]] = None,
+        viewer_id: Optional[int] = None,
+        friends_only: bool = False
+    ) -> bytes:
+        """JSON della classifica (lista di PlayerProgress) per un certo utente"""
+        friend_ids = friend_ids or set()
+
+        if friends_only and viewer_id is not None:
+            # Solo amici + se stessi: costo proporzionale al numero di amici
+            members = [self._sort_keys[uid] for uid in friend_ids | {viewer_id} if uid in self._sort_keys]
+            members.sort()
+            return self._join((key[2] for key in members), friend_ids)
+
+        # Snapshot condiviso; per chi ha amici in classifica costo proporzionale agli amici
+        return self._with_friends(friend_ids)
+
+    def render_delta(
+        self,
+        since: int,
+        friend_ids: Optional[Set[int]] = None,
+        viewer_id: Optional[int] = None,
+        friends_only: bool = False,
+        full: bool = False
+    ) -> bytes:
+        """
+        JSON {"version", "full", "players", "removed"} con i soli giocatori
+        cambiati dopo `since`; se il cursore è troppo vecchio (o di un'altra
+        istanza del server), o con `full` (amici del lettore cambiati),
+        "full" è true e "players" è la classifica intera
+        """
+        friend_ids = friend_ids or set()
+        changed = None if full else self.changed_since(since)
+
+        if changed is None:
+            players = self.render(friend_ids, viewer_id, friends_only)
+            removed = []
+        else:
+            if friends_only and viewer_id is not None:
+                changed &= friend_ids | {viewer_id}
+            members = sorted(self._sort_keys[uid] for uid in changed if uid in self._sort_keys)
+            players = self._join((key[2] for key in members), friend_ids)
+            removed = sorted(uid for uid in changed if uid in self._removed)
+
+        return (
+            b'{"version":' + str(self.version).encode()
+            + b',"full":' + (b"true" if changed is None else b"false")
+            + b',"players":' + players
+            + b',"removed":' + _dumps(removed) + b"}"
+        )
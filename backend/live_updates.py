@@ -0,0 +1,181 @@
+"""
+Live progress push for Hot and Cold Game
+In-process pub/sub: progress writes mark a board as changed, a single tick
+loop coalesces the changes and wakes the SSE subscribers of that board.
+A change of a viewer's friends wakes that viewer's subscribers right away.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Ogni quanto i cambiamenti accumulati vengono notificati ai client connessi
+LIVE_TICK_MS = int(os.getenv("LIVE_TICK_MS", "1000"))
+
+# Commento SSE inviato a connessione inattiva (tiene aperti proxy e load balancer)
+LIVE_KEEPALIVE_SECONDS = int(os.getenv("LIVE_KEEPALIVE_SECONDS", "25"))
+
+# Connessioni SSE contemporanee per processo (oltre: 503, il client torna al polling)
+LIVE_MAX_CONNECTIONS = int(os.getenv("LIVE_MAX_CONNECTIONS", "2000"))
+
+
+class Subscription:
+    """Un client connesso a una partita"""
+
+    __slots__ = ("game_key", "viewer_id", "event", "changed_at", "friends_changed")
+
+    def __init__(self, game_key: str, viewer_id: Optional[int] = None):
+        self.game_key = game_key
+        self.viewer_id = viewer_id
+        self.event = asyncio.Event()
+        self.changed_at: Optional[float] = None  # primo cambiamento non ancora inviato
+        self.friends_changed = False  # amici del lettore cambiati: serve la lista completa
+
+    def consume(self) -> Optional[float]:
+        """Azzera la notifica e ritorna quando è avvenuto il primo cambiamento"""
+        changed_at, self.changed_at = self.changed_at, None
+        self.event.clear()
+        return changed_at
+
+
+class ProgressHub:
+    """
+    Pub/sub in memoria per le classifiche.
+    publish() costa O(1); il fan-out avviene una volta per tick e per partita,
+    qualunque sia il numero di aggiornamenti arrivati nel frattempo.
+    """
+
+    def __init__(self, tick_ms: int = LIVE_TICK_MS, max_connections: int = LIVE_MAX_CONNECTIONS):
+        self.tick = tick_ms / 1000
+        self.max_connections = max_connections
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._viewers: Dict[int, Set[Subscription]] = {}  # user_id -> stream aperti
+        self._dirty: Dict[str, float] = {}  # game_key -> primo cambiamento nel tick
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+
+        # Chiamata a ogni tick con le partite seguite, prima del fan-out
+        # (con uno stato condiviso scopre le scritture degli altri worker)
+        self.poll: Optional[Callable[[List[str]], Awaitable[None]]] = None
+
+        # Metriche
+        self.connections = 0
+        self.published = 0
+        self.notifications = 0
+        self.deliveries = 0
+        self.dropped = 0  # notifiche accorpate perché il client non aveva letto la precedente
+        self._latencies = deque(maxlen=1000)  # ms tra il cambiamento e l'invio al client
+
+    def full(self) -> bool:
+        return self.connections >= self.max_connections
+
+    def subscribe(self, game_key: str, viewer_id: Optional[int] = None) -> Subscription:
+        """Registra un client (da rimuovere con unsubscribe alla disconnessione)"""
+        sub = Subscription(game_key, viewer_id)
+        self._subscribers.setdefault(game_key, set()).add(sub)
+        if viewer_id is not None:
+            self._viewers.setdefault(viewer_id, set()).add(sub)
+        self.connections += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._subscribers.get(sub.game_key)
+        if subs is None or sub not in subs:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self._subscribers[sub.game_key]
+        viewer_subs = self._viewers.get(sub.viewer_id)
+        if viewer_subs is not None:
+            viewer_subs.discard(sub)
+            if not viewer_subs:
+                del self._viewers[sub.viewer_id]
+        self.connections -= 1
+
+    def publish(self, game_key: str) -> None:
+        """Segnala che la classifica è cambiata (notificata al prossimo tick)"""
+        self.published += 1
+        if game_key in self._subscribers:
+            self._dirty.setdefault(game_key, time.perf_counter())
+
+    def friends_changed(self, *user_ids: int) -> None:
+        """Amici cambiati: gli stream di questi utenti inviano subito la lista completa"""
+        now = time.perf_counter()
+        for user_id in user_ids:
+            for sub in self._viewers.get(user_id, ()):
+                sub.friends_changed = True
+                if sub.changed_at is None:
+                    sub.changed_at = now
+                sub.event.set()
+
+    def fan_out(self) -> None:
+        """Sveglia i client delle partite cambiate dall'ultimo tick"""
+        dirty, self._dirty = self._dirty, {}
+        for game_key, changed_at in dirty.items():
+            for sub in self._subscribers.get(game_key, ()):
+                self.notifications += 1
+                if sub.event.is_set():
+                    self.dropped += 1
+                    continue
+                sub.changed_at = changed_at
+                sub.event.set()
+
+    def delivered(self, changed_at: Optional[float]) -> None:
+        self.deliveries += 1
+        if changed_at is not None:
+            self._latencies.append((time.perf_counter() - changed_at) * 1000)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                if self.poll is not None and self._subscribers:
+                    await self.poll(list(self._subscribers))
+                self.fan_out()
+            except Exception as e:
+                logger.error(f"❌ Errore fan-out progressi: {e}")
+
+    def start(self) -> None:
+        """Avvia il tick di fan-out (da chiamare nello startup dell'app)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Ferma il tick e chiude gli stream aperti (shutdown)"""
+        self.closed = True
+        for subs in self._subscribers.values():
+            for sub in subs:
+                sub.event.set()
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        return {
+            "connections": self.connections,
+            "games": len(self._subscribers),
+            "published": self.published,
+            "notifications": self.notifications,
+            "deliveries": self.deliveries,
+            "dropped": self.dropped,
+            "fanout_latency_ms": {
+                "avg": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                "p99": round(latencies[int(len(latencies) * 0.99)], 2) if latencies else 0.0,
+                "max": round(latencies[-1], 2) if latencies else 0.0,
+            },
+        }
+
+
+# Istanza globale usata da /api/game/progress e /api/game/live
+progress_hub = ProgressHub()
@@ -5,14 +5,19 @@ Hot and Cold Game - FastAPI Backend
 Gestisce il modello FastText e la logica del gioco
 """
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 import uvicorn
 from datetime import datetime, timezone
+from threading import Lock, Thread
+from queue import PriorityQueue
+import itertools
 import hashlib
+import asyncio
 import os
 from gensim.models import KeyedVectors
 import numpy as np
@@ -20,10 +25,27 @@ import logging
 import random
 
 # Import database and auth
-from database import init_db, User
-from auth import get_current_user
+from archive import (
+    GAME_START_DATE,
+    ColdDateLimiter,
+    RankingStore,
+    archive_dates,
+    validate_game_date,
+)
+from cache import LRUCache
+from database import init_db, dispose_engines, User
+from engine import create_ranking_engine
+from live_updates import progress_hub
+from prefork import process_memory, serve_prefork
+from progress_buffer import progress_buffer
+from state_backend import create_state_store, state_backend
+from state_store import state_stats, state_sweeper
+from shot_tokens import SHOT_STATELESS_TOKENS, ShotTokenSigner, database_digest
+from friend_graph import friend_graph
+from avatars import UPLOAD_DIR, AvatarStaticFiles, avatar_sweeper
+from auth import get_current_user, login_ip_throttle, login_username_throttle, password_hasher
 from routers.auth_router import router as auth_router
-from routers.users_router import router as users_router
+from routers.users_router import router as users_router, AvatarUploadLimit
 from routers.game_router import router as game_router
 from routers.friends_router import router as friends_router
 
@@ -31,6 +53,27 @@ from routers.friends_router import router as friends_router
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Numero massimo di risposte /guess pre-serializzate tenute in memoria
+GUESS_CACHE_SIZE = int(os.getenv("GUESS_CACHE_SIZE", "20000"))
+
+# Se il ranking della data non è ancora pronto, /guess risponde subito con la sola
+# similarità (temperatura stimata) e calcola il ranking in background.
+# Impostare a "0" per tornare al comportamento bloccante.
+NONBLOCKING_RANKINGS = os.getenv("NONBLOCKING_RANKINGS", "1") == "1"
+
+# Priorità dei ranking in background (più bassa = prima): le date chieste dai giocatori
+# passano davanti al pre-calcolo dell'archivio
+RANKING_PRIORITY_REQUEST = 0
+RANKING_PRIORITY_PRECOMPUTE = 1
+RANKING_RUNNING = -1
+
+# Durata e numero massimo delle partite Shot in memoria
+SHOT_GAME_TTL_SECONDS = int(os.getenv("SHOT_GAME_TTL_SECONDS", "21600"))
+SHOT_GAMES_MAX = int(os.getenv("SHOT_GAMES_MAX", "10000"))
+
+# Numero di worker per `python main.py` in modalità prefork (0 = uvicorn singolo con reload)
+PREFORK_WORKERS = int(os.getenv("PREFORK_WORKERS", "0"))
+
 # Inizializza FastAPI
 app = FastAPI(
     title="Hot and Cold Game API",
@@ -38,7 +81,10 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# CORS per permettere richieste da Flutter
+# Upload dell'avatar oltre il limite rifiutati mentre arrivano
+app.add_middleware(AvatarUploadLimit)
+
+# CORS per permettere richieste da Flutter (aggiunto per ultimo: è il più esterno)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # In produzione, specifica i domini esatti
@@ -54,11 +100,10 @@ app.include_router(game_router)
 app.include_router(friends_router)
 
 # Create uploads directory for avatars
-UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# Serve static files (avatars)
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+# Serve static files (avatars: varianti con hash nel nome in cache per sempre)
+app.mount("/uploads", AvatarStaticFiles(directory=UPLOAD_DIR), name="uploads")
 
 # Modelli Pydantic per richieste/risposte
 class GuessRequest(BaseModel):
@@ -74,6 +119,7 @@ class GuessResponse(BaseModel):
     similarity: Optional[float] = None
     temperature: Optional[str] = None
     message: Optional[str] = None
+    provisional: bool = False  # True se rank non ancora disponibile (temperatura stimata)
 
 class DailyWordInfo(BaseModel):
     date: str
@@ -111,9 +157,22 @@ class GameManager:
         self.model = None
         self.vocab = None
         self.daily_words = []  # Lista di parole per ogni giorno
-        self.rankings_cache = {}  # Cache dei ranking pre-calcolati
+        self.rankings_cache = LRUCache(maxsize=100)  # Cache dei ranking pre-calcolati
+        self.ranking_store = RankingStore()  # Ranking persistiti su disco
+        self.rankings_pending = {}  # Parola segreta -> priorità del ranking in coda (RANKING_RUNNING se in calcolo)
+        self._rankings_lock = Lock()
+        self._rankings_queue = PriorityQueue()  # (priorità, ordine di arrivo, parola segreta)
+        self._rankings_seq = itertools.count()
+        self._rankings_workers_pid = None
+        self._rankings_tasks: Dict[str, asyncio.Future] = {}  # calcoli in corso per le richieste
+        self.engine = create_ranking_engine()  # Calcoli vettoriali (inline o pool di processi)
         self.shot_word_database = []  # Database di parole con indizi per gioco Shot
-        self.active_shot_games = {}  # game_id -> target_word
+        self.active_shot_games = create_state_store(  # game_id -> target_word
+            "shot_games",
+            default_ttl=SHOT_GAME_TTL_SECONDS,
+            maxsize=SHOT_GAMES_MAX
+        )
+        self.shot_tokens = None  # firma dei game_id con SHOT_STATELESS_TOKENS=1
         
     def load_model(self, model_path: str = "fasttext_it.model"):
         """Carica il modello FastText"""
@@ -125,6 +184,12 @@ class GameManager:
         
         self.model = KeyedVectors.load(model_path)
         self.vocab = list(self.model.key_to_index.keys())
+
+        # Norme calcolate una volta sola (condivise dai worker in prefork)
+        self.model.fill_norms()
+
+        # Engine per ranking e vicini; i ranking in background usano tutti i suoi worker
+        self.engine.start(self.model.vectors, self.model.norms)
         logger.info(f"✅ Modello caricato: {len(self.vocab)} parole")
         
         # Carica dizionario italiano (60k parole verificate)
@@ -188,14 +253,18 @@ class GameManager:
         """Carica il database di parole con indizi per il gioco Shot"""
         import json
 
+        raw = b""
         if os.path.exists(database_file):
-            with open(database_file, 'r', encoding='utf-8') as f:
-                self.shot_word_database = json.load(f)
+            with open(database_file, 'rb') as f:
+                raw = f.read()
+            self.shot_word_database = json.loads(raw.decode('utf-8'))
             logger.info(f"✅ Caricato database Shot con {len(self.shot_word_database)} parole")
         else:
             logger.warning(f"⚠️ File '{database_file}' non trovato!")
             self.shot_word_database = []
 
+        self.shot_tokens = ShotTokenSigner(database_digest(raw), SHOT_GAME_TTL_SECONDS)
+
     def start_new_shot_game(self) -> Dict:
         """Avvia una nuova partita Shot"""
         import uuid
@@ -205,19 +274,20 @@ class GameManager:
             raise HTTPException(status_code=500, detail="Database parole Shot non caricato")
 
         # 1. Seleziona una entry casuale dal database (già con target e indizi)
-        word_entry = random.choice(self.shot_word_database)
+        entry_index = random.randrange(len(self.shot_word_database))
+        word_entry = self.shot_word_database[entry_index]
 
         target_word = word_entry['target'].lower()
         clue_words = [clue.upper() for clue in word_entry['clues']]
 
         # 2. Genera ID e salva stato
-        game_id = str(uuid.uuid4())
-        self.active_shot_games[game_id] = target_word
-
-        # 3. Opzionale: pulizia vecchie partite se troppe
-        if len(self.active_shot_games) > 1000:
-            # Rimuovi una a caso (semplice garbage collection)
-            self.active_shot_games.pop(next(iter(self.active_shot_games)))
+        if SHOT_STATELESS_TOKENS:
+            # Il game_id firmato contiene indice e scadenza: niente da salvare
+            game_id = self.shot_tokens.issue(entry_index)
+        else:
+            game_id = str(uuid.uuid4())
+            # (scade dopo SHOT_GAME_TTL_SECONDS; se sono troppe esce la più vecchia)
+            self.active_shot_games.set(game_id, target_word)
 
         logger.info(f"🎮 Nuova partita Shot: {game_id} -> {target_word.upper()}")
 
@@ -229,10 +299,10 @@ class GameManager:
 
     def check_shot_guess(self, game_id: str, guess: str) -> Dict:
         """Verifica un tentativo Shot"""
-        if game_id not in self.active_shot_games:
+        target_word = self.get_shot_target(game_id)
+        if target_word is None:
             raise HTTPException(status_code=404, detail="Partita non trovata o scaduta")
-            
-        target_word = self.active_shot_games[game_id]
+
         guess = guess.strip().lower()
         
         is_correct = (guess == target_word)
@@ -246,9 +316,20 @@ class GameManager:
             result["target_word"] = target_word
             # Rimuovi partita attiva? O lasciala per permettere refresh?
             # Meglio lasciarla o rimuoverla dopo un po'. Per ora lasciamo.
-            del self.active_shot_games[game_id]
-            
+            if not SHOT_STATELESS_TOKENS:
+                self.active_shot_games.pop(game_id)
+
         return result
+
+    def get_shot_target(self, game_id: str) -> Optional[str]:
+        """Parola da indovinare della partita Shot (None se inesistente o scaduta)"""
+        if not SHOT_STATELESS_TOKENS:
+            return self.active_shot_games.get(game_id)
+
+        entry_index = self.shot_tokens.verify(game_id)
+        if entry_index is None or entry_index >= len(self.shot_word_database):
+            return None
+        return self.shot_word_database[entry_index]['target'].lower()
     
     def get_daily_word(self, date_str: Optional[str] = None) -> str:
         """Ottiene la parola del giorno (deterministica basata su data)"""
@@ -266,38 +347,157 @@ class GameManager:
     
     def get_game_number(self, date_str: str) -> int:
         """Calcola il numero del gioco dalla data di inizio"""
-        # Data di inizio del gioco (modifica questa data)
-        start_date = datetime(2025, 11, 1, tzinfo=timezone.utc).date()
         current_date = datetime.fromisoformat(date_str).date()
-        delta = (current_date - start_date).days
+        delta = (current_date - GAME_START_DATE).days
         return max(1, delta + 1)
+
+    def compute_rankings(self, secret_word: str) -> np.ndarray:
+        """
+        Calcola (e salva su disco) il rank di ogni parola rispetto alla parola segreta.
+        Ritorna un array int32 indicizzato come il vocabolario del modello
+        (la parola segreta ha rank 0, la più vicina rank 1, come most_similar).
+        """
+        secret_index = self.model.key_to_index[secret_word]
+        return self.engine.compute_rankings(secret_index, self.ranking_store.path(secret_word))
+
+    def nearest_words(self, secret_word: str, topn: int) -> List[Tuple[str, float]]:
+        """
+        Le topn parole più vicine con similarità coseno (come most_similar).
+        Usa il ranking se già pronto, altrimenti l'engine.
+        """
+        secret_index = self.model.key_to_index[secret_word]
+        rankings = self.get_cached_rankings(secret_word)
+
+        if rankings is not None:
+            indices = np.flatnonzero((rankings >= 1) & (rankings <= topn))
+            indices = indices[np.argsort(rankings[indices])]
+            vectors, norms = self.model.vectors, self.model.norms
+            similarities = (vectors[indices] @ vectors[secret_index]) / (norms[indices] * norms[secret_index])
+        else:
+            indices, similarities = self.engine.nearest(secret_index, topn)
+
+        return [(self.vocab[i], float(sim)) for i, sim in zip(indices, similarities)]
     
-    def get_or_compute_rankings(self, secret_word: str) -> Dict[str, int]:
-        """Ottiene o calcola ranking per parola segreta (con cache)"""
-        if secret_word in self.rankings_cache:
-            return self.rankings_cache[secret_word]
+    def get_or_compute_rankings(self, secret_word: str) -> np.ndarray:
+        """Ottiene o calcola ranking per parola segreta (cache, poi disco, poi calcolo)"""
+        rankings = self.get_cached_rankings(secret_word)
+        if rankings is not None:
+            return rankings
         
         logger.info(f"🔄 Calcolo ranking per '{secret_word}'...")
         
-        # Calcola ranking usando most_similar
-        similar_words = self.model.most_similar(
-            positive=[secret_word],
-            topn=len(self.vocab)
-        )
+        # Persistito su disco dall'engine: ogni parola viene calcolata una sola volta
+        rankings = self.compute_rankings(secret_word)
         
-        rankings = {
-            word: rank + 1
-            for rank, (word, _) in enumerate(similar_words)
-        }
-        
-        # Cache (limitata a 100 parole per non usare troppa RAM)
-        if len(self.rankings_cache) < 100:
-            self.rankings_cache[secret_word] = rankings
+        # Cache LRU (limitata a 100 parole per non usare troppa RAM)
+        self.rankings_cache.set(secret_word, rankings)
         
         logger.info(f"✅ Ranking calcolato per {len(rankings)} parole")
         
         return rankings
-    
+
+    async def get_or_compute_rankings_async(self, secret_word: str) -> np.ndarray:
+        """
+        Come get_or_compute_rankings, da una coroutine: attende l'engine senza
+        bloccare l'event loop. Richieste contemporanee attendono lo stesso calcolo.
+        """
+        rankings = self.get_cached_rankings(secret_word)
+        if rankings is not None:
+            return rankings
+
+        task = self._rankings_tasks.get(secret_word)
+        if task is None:
+            task = asyncio.ensure_future(self._compute_rankings_async(secret_word))
+            self._rankings_tasks[secret_word] = task
+            task.add_done_callback(lambda _: self._rankings_tasks.pop(secret_word, None))
+        # shield: una richiesta annullata non interrompe il calcolo atteso dalle altre
+        return await asyncio.shield(task)
+
+    async def _compute_rankings_async(self, secret_word: str) -> np.ndarray:
+        logger.info(f"🔄 Calcolo ranking per '{secret_word}'...")
+        secret_index = self.model.key_to_index[secret_word]
+        rankings = await self.engine.rank(secret_index, self.ranking_store.path(secret_word))
+        self.rankings_cache.set(secret_word, rankings)
+        logger.info(f"✅ Ranking calcolato per {len(rankings)} parole")
+        return rankings
+
+    def get_cached_rankings(self, secret_word: str) -> Optional[np.ndarray]:
+        """Ranking se già in memoria o su disco, altrimenti None (non blocca)"""
+        rankings = self.rankings_cache.get(secret_word)
+        if rankings is not None:
+            return rankings
+
+        rankings = self.ranking_store.load(secret_word, len(self.vocab))
+        if rankings is not None:
+            self.rankings_cache.set(secret_word, rankings)
+        return rankings
+
+    def get_rank(self, rankings: np.ndarray, word: str) -> int:
+        """Rank di una parola (fuori vocabolario = ultima posizione)"""
+        index = self.model.key_to_index.get(word)
+        if index is None:
+            return len(self.vocab)
+        return int(rankings[index])
+
+    def schedule_rankings(self, secret_word: str, priority: int = RANKING_PRIORITY_REQUEST) -> None:
+        """
+        Accoda il calcolo del ranking in background (una sola volta per parola).
+        Le richieste dei giocatori passano davanti al pre-calcolo dell'archivio,
+        anche per una parola già in coda con priorità più bassa.
+        """
+        with self._rankings_lock:
+            current = self.rankings_pending.get(secret_word)
+            if current is not None and current <= priority:
+                return
+            # Parola nuova o promossa: l'eventuale voce precedente in coda verrà saltata
+            self.rankings_pending[secret_word] = priority
+            self._start_rankings_workers()
+        self._rankings_queue.put((priority, next(self._rankings_seq), secret_word))
+
+    def _start_rankings_workers(self) -> None:
+        # Avviati al primo uso, quindi nel processo che li usa (dopo il fork del prefork)
+        if self._rankings_workers_pid == os.getpid():
+            return
+        self._rankings_workers_pid = os.getpid()
+        for i in range(self.engine.workers):
+            Thread(target=self._rankings_worker, name=f"rankings_{i}", daemon=True).start()
+
+    def _rankings_worker(self) -> None:
+        while True:
+            priority, _, secret_word = self._rankings_queue.get()
+            if secret_word is None:
+                return  # shutdown
+            with self._rankings_lock:
+                if self.rankings_pending.get(secret_word) != priority:
+                    continue  # voce superata da una promozione (o già calcolata)
+                self.rankings_pending[secret_word] = RANKING_RUNNING
+            self._compute_rankings_background(secret_word)
+
+    def stop_rankings_workers(self) -> None:
+        """Shutdown: i worker escono dopo il calcolo in corso, la coda viene abbandonata"""
+        for _ in range(self.engine.workers):
+            self._rankings_queue.put((RANKING_RUNNING - 1, next(self._rankings_seq), None))
+
+    def _compute_rankings_background(self, secret_word: str) -> None:
+        try:
+            self.get_or_compute_rankings(secret_word)
+        except Exception as e:
+            logger.error(f"❌ Errore calcolo ranking per '{secret_word}': {e}")
+        finally:
+            with self._rankings_lock:
+                self.rankings_pending.pop(secret_word, None)
+
+    def precompute_archive(self) -> int:
+        """Accoda il calcolo (su disco) dei ranking di tutte le date dell'archivio"""
+        queued = 0
+        for date_str in archive_dates():
+            secret_word = self.get_daily_word(date_str)
+            if not self.ranking_store.exists(secret_word):
+                self.schedule_rankings(secret_word, RANKING_PRIORITY_PRECOMPUTE)
+                queued += 1
+        logger.info(f"📚 Archivio: {queued} ranking accodati per il pre-calcolo")
+        return queued
+
     def calculate_similarity(self, word1: str, word2: str) -> float:
         """Calcola similarità tra due parole (normalizzata 0-1)"""
         similarity = self.model.similarity(word1.lower(), word2.lower())
@@ -320,6 +520,26 @@ class GameManager:
         
         return True
     
+    def similarity_to_temperature(self, similarity: float) -> str:
+        """
+        Stima la temperatura dalla sola similarità (0-1) quando il ranking
+        non è ancora disponibile. Soglie calibrate sulle fasce di rank tipiche.
+        """
+        if similarity >= 0.85:
+            return "🔥🔥🔥 Caldissimo!"
+        elif similarity >= 0.78:
+            return "🔥🔥 Molto caldo!"
+        elif similarity >= 0.74:
+            return "🔥 Caldo!"
+        elif similarity >= 0.68:
+            return "🌡️ Tiepido"
+        elif similarity >= 0.64:
+            return "❄️ Freddo"
+        elif similarity >= 0.58:
+            return "❄️❄️ Molto freddo"
+        else:
+            return "🧊 Ghiacciato!"
+
     def rank_to_temperature(self, rank: int) -> str:
         """Converte rank in temperatura"""
         if rank == 1:
@@ -342,22 +562,64 @@ class GameManager:
 # Istanza globale del game manager
 game_manager = GameManager()
 
+
+def load_game_data():
+    """Inizializza database e carica tutti i dati di gioco in sola lettura"""
+    init_db()
+    logger.info("✅ Database inizializzato!")
+
+    game_manager.load_model()
+
+
+# Limite per client sulle date d'archivio con ranking non ancora pronto
+cold_date_limiter = ColdDateLimiter()
+
+# Cache LRU delle risposte /guess: (data, parola normalizzata) -> JSON pre-serializzato
+# Il traffico è molto sbilanciato (tutti provano "casa", "amore", ...), quindi le
+# parole più popolari saltano validazione, ranking, similarità e serializzazione
+guess_cache = LRUCache(maxsize=GUESS_CACHE_SIZE)
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
     """Inizializza il gioco al avvio del server"""
     try:
-        # Initialize database
-        init_db()
-        logger.info("✅ Database inizializzato!")
-
-        game_manager.load_model()
-        game_manager.load_shot_words()
+        # In prefork i dati sono già stati caricati dal master prima del fork
+        if game_manager.model is None:
+            load_game_data()
+
+        # Flush periodico dei progressi di gioco (write-behind)
+        progress_buffer.start()
+
+        # Tick del fan-out per gli stream live dei progressi
+        progress_hub.start()
+
+        # Pulizia dello stato in memoria scaduto (classifiche, partite Shot)
+        state_sweeper.start()
+
+        # Pre-calcola in background il ranking di oggi, poi il resto dell'archivio
+        # (in prefork solo il primo worker, gli altri trovano i ranking su disco);
+        # lo stesso worker elimina gli avatar non più usati
+        game_manager.schedule_rankings(game_manager.get_daily_word())
+        if os.getenv("PREFORK_WORKER_ID", "0") == "0":
+            game_manager.precompute_archive()
+            avatar_sweeper.start()
         logger.info("✅ Server pronto!")
     except Exception as e:
         logger.error(f"❌ Errore durante inizializzazione: {e}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Scrive i progressi in attesa e ferma i calcoli in background"""
+    await progress_hub.stop()
+    await state_sweeper.stop()
+    await avatar_sweeper.stop()
+    state_backend.close()
+    await progress_buffer.stop()
+    game_manager.stop_rankings_workers()
+    game_manager.engine.shutdown()
+
 # Routes
 @app.get("/")
 async def root():
@@ -374,6 +636,7 @@ async def root():
             "hint": "/hint/{date}",
             "shot_new_game": "/shot/new-game (POST)",
             "shot_guess": "/shot/guess (POST)",
+            "metrics": "/metrics",
         }
     }
 
@@ -409,7 +672,7 @@ async def get_daily_word_info(date: Optional[str] = None):
     )
 
 @app.post("/guess", response_model=GuessResponse)
-async def make_guess(request: GuessRequest):
+async def make_guess(request: GuessRequest, http_request: Request):
     """Valuta un tentativo"""
     guess_word = request.word.strip().lower()
     
@@ -417,8 +680,27 @@ async def make_guess(request: GuessRequest):
     if not request.date:
         date = datetime.now(timezone.utc).date().isoformat()
     else:
-        date = request.date
-    
+        date = validate_game_date(request.date)
+
+    # Risposta già calcolata per questa parola oggi?
+    cache_key = (date, guess_word)
+    cached = guess_cache.get(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
+    client_id = http_request.client.host if http_request.client else "unknown"
+    result = await evaluate_guess(guess_word, date, client_id)
+    payload = result.model_dump_json().encode("utf-8")
+
+    # Le risposte provvisorie non vanno in cache: il prossimo tentativo avrà il rank esatto
+    if not result.provisional:
+        guess_cache.set(cache_key, payload)
+
+    return Response(content=payload, media_type="application/json")
+
+
+async def evaluate_guess(guess_word: str, date: str, client_id: str) -> GuessResponse:
+    """Calcola la risposta completa per un tentativo (senza cache)"""
     secret_word = game_manager.get_daily_word(date)
     
     # Valida parola
@@ -443,9 +725,30 @@ async def make_guess(request: GuessRequest):
             message="Congratulazioni! Hai indovinato!"
         )
     
-    # Calcola rank e similarità
-    rankings = game_manager.get_or_compute_rankings(secret_word)
-    rank = rankings.get(guess_word, len(game_manager.vocab))
+    # Data "fredda" (ranking non ancora pronto): conta nel limite del client
+    rankings = game_manager.get_cached_rankings(secret_word)
+    if rankings is None:
+        cold_date_limiter.check(client_id, date)
+
+    # Ranking non ancora pronto: risposta immediata con temperatura stimata
+    if rankings is None and NONBLOCKING_RANKINGS:
+        game_manager.schedule_rankings(secret_word)
+        similarity = game_manager.calculate_similarity(secret_word, guess_word)
+        return GuessResponse(
+            word=guess_word,
+            valid=True,
+            correct=False,
+            total_words=len(game_manager.vocab),
+            similarity=similarity,
+            temperature=game_manager.similarity_to_temperature(similarity),
+            message="Classifica in preparazione, temperatura stimata",
+            provisional=True
+        )
+
+    # Calcola rank e similarità (ranking mancante: calcolo fuori dall'event loop)
+    if rankings is None:
+        rankings = await game_manager.get_or_compute_rankings_async(secret_word)
+    rank = game_manager.get_rank(rankings, guess_word)
     similarity = game_manager.calculate_similarity(secret_word, guess_word)
     temperature = game_manager.rank_to_temperature(rank)
     
@@ -464,11 +767,13 @@ async def get_hint(date: Optional[str] = None):
     """Ottiene un suggerimento casuale tra rank 20 e 150"""
     if not date:
         date = datetime.now(timezone.utc).date().isoformat()
+    else:
+        date = validate_game_date(date)
 
     secret_word = game_manager.get_daily_word(date)
 
-    # Ottieni parole simili
-    similar = game_manager.model.most_similar(secret_word, topn=200)
+    # Ottieni parole simili (fuori dall'event loop)
+    similar = await run_in_threadpool(game_manager.nearest_words, secret_word, 200)
 
     # Filtra solo parole valide con rank tra 20 e 150
     valid_similar = [
@@ -492,9 +797,11 @@ async def get_hint(date: Optional[str] = None):
 @app.get("/hint/{date}")
 async def get_hint_debug(date: str, top_n: int = 5):
     """Ottiene suggerimento (parole più vicine) - per debug/aiuto"""
+    date = validate_game_date(date)
     secret_word = game_manager.get_daily_word(date)
+    top_n = max(1, min(top_n, 100))
     
-    similar = game_manager.model.most_similar(secret_word, topn=top_n)
+    similar = await run_in_threadpool(game_manager.nearest_words, secret_word, top_n)
     
     hints = [
         {
@@ -514,7 +821,8 @@ async def get_hint_debug(date: str, top_n: int = 5):
 @app.post("/shot/new-game", response_model=ShotNewGameResponse)
 async def shot_new_game():
     """Avvia una nuova partita Shot"""
-    game_data = game_manager.start_new_shot_game()
+    # Lo store delle partite può essere condiviso (SQLite/Redis): fuori dall'event loop
+    game_data = await run_in_threadpool(game_manager.start_new_shot_game)
     return ShotNewGameResponse(
         game_id=game_data["game_id"],
         clue_words=game_data["clue_words"]
@@ -523,7 +831,7 @@ async def shot_new_game():
 @app.post("/shot/guess", response_model=ShotGuessResponse)
 async def shot_guess(request: ShotGuessRequest):
     """Valuta un tentativo Shot"""
-    result = game_manager.check_shot_guess(request.game_id, request.guess)
+    result = await run_in_threadpool(game_manager.check_shot_guess, request.game_id, request.guess)
     return ShotGuessResponse(
         correct=result["correct"],
         target_word=result.get("target_word"),
@@ -539,12 +847,48 @@ async def health_check():
         "vocab_size": len(game_manager.vocab) if game_manager.vocab else 0
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Metriche interne (cache, code, ...) per monitoring"""
+    return {
+        "guess_cache": guess_cache.stats(),
+        "rankings_cache": game_manager.rankings_cache.stats(),
+        "rankings_pending": len(game_manager.rankings_pending),
+        "rankings_on_disk": game_manager.ranking_store.count(),
+        "ranking_engine": game_manager.engine.stats(),
+        "progress_buffer": progress_buffer.stats(),
+        "live": progress_hub.stats(),
+        "state": await run_in_threadpool(state_stats),
+        "state_backend": await run_in_threadpool(state_backend.stats),
+        "shot_tokens": game_manager.shot_tokens.stats() if game_manager.shot_tokens else None,
+        "friend_graph": friend_graph.stats(),
+        "auth": {
+            "bcrypt": password_hasher.stats(),
+            "login_ip": login_ip_throttle.stats(),
+            "login_username": login_username_throttle.stats(),
+        },
+        "archive_cold_dates": cold_date_limiter.stats(),
+        "memory": process_memory(),
+    }
+
 # Main per esecuzione diretta
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    )
+    if PREFORK_WORKERS > 0:
+        # Carica tutto una volta nel master, poi forka i worker (copy-on-write)
+        load_game_data()
+        serve_prefork(
+            app,
+            host="0.0.0.0",
+            port=8000,
+            workers=PREFORK_WORKERS,
+            after_fork=lambda: dispose_engines(close=False)
+        )
+        game_manager.engine.shutdown()
+    else:
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=8000,
+            reload=True,
+            log_level="info"
+        )
@@ -0,0 +1,208 @@
+"""
+Prefork server for Hot and Cold Game
+The master loads read-only game data once, freezes the GC and forks N uvicorn
+workers that share those pages copy-on-write. Crashed workers are restarted
+with exponential backoff; too many crashes in a short window stop the master.
+"""
+
+import gc
+import os
+import signal
+import socket
+import time
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+# Ogni quanto il master logga la memoria condivisa/privata dei worker
+MEMORY_REPORT_INTERVAL = int(os.getenv("PREFORK_MEMORY_REPORT_INTERVAL", "300"))
+
+# Riavvio dei worker terminati: attesa 1, 2, 4... secondi (fino al massimo) in base ai
+# riavvii dello stesso worker nella finestra; oltre PREFORK_MAX_RESTARTS il master si ferma
+PREFORK_RESTART_BACKOFF_MAX = float(os.getenv("PREFORK_RESTART_BACKOFF_MAX", "30"))
+PREFORK_MAX_RESTARTS = int(os.getenv("PREFORK_MAX_RESTARTS", "5"))
+PREFORK_RESTART_WINDOW = int(os.getenv("PREFORK_RESTART_WINDOW", "60"))
+
+
+def process_memory(pid: str = "self") -> Dict[str, float]:
+    """
+    Memoria di un processo in MB da /proc/<pid>/smaps_rollup (solo Linux).
+    shared = pagine condivise con altri processi (es. dati caricati dal master)
+    private = pagine solo di questo processo (copiate dopo il fork o nuove)
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return {}
+
+    def mb(*names):
+        return round(sum(fields.get(name, 0) for name in names) / 1024, 1)
+
+    return {
+        "rss_mb": mb("Rss"),
+        "pss_mb": mb("Pss"),
+        "shared_mb": mb("Shared_Clean", "Shared_Dirty"),
+        "private_mb": mb("Private_Clean", "Private_Dirty"),
+    }
+
+
+def describe_exit(status: int) -> str:
+    """Stato di uscita di waitpid in forma leggibile"""
+    if os.WIFSIGNALED(status):
+        signum = os.WTERMSIG(status)
+        try:
+            return f"segnale {signal.Signals(signum).name}"
+        except ValueError:
+            return f"segnale {signum}"
+    return f"codice {os.waitstatus_to_exitcode(status)}"
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, worker_id: int, after_fork: Optional[Callable]) -> None:
+    os.environ["PREFORK_WORKER_ID"] = str(worker_id)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    if after_fork:
+        after_fork()
+
+    config = uvicorn.Config(app, log_level="info")
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def serve_prefork(
+    app,
+    host: str = "0.0.0.0",
+    port: int = 8000,
+    workers: int = 2,
+    after_fork: Optional[Callable] = None
+) -> None:
+    """
+    Avvia N worker uvicorn forkati dal processo corrente.
+    I dati di gioco devono essere già caricati: qui si congela il GC così che
+    refcount/collector non tocchino le pagine condivise con i figli.
+    """
+    gc.collect()
+    gc.freeze()
+    logger.info(f"🧊 gc.freeze(): {gc.get_freeze_count()} oggetti congelati nel master")
+
+    sock = _bind_socket(host, port)
+    children: Dict[int, int] = {}  # pid -> worker_id
+    respawn_at: Dict[int, float] = {}  # worker_id -> quando riavviarlo (backoff)
+    restarts: Dict[int, Deque[float]] = {}  # worker_id -> riavvii nella finestra
+    stopping = False
+    failed = False
+
+    def spawn(worker_id: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1  # eccezione nel worker: uscita con errore
+            try:
+                _run_worker(app, sock, worker_id, after_fork)
+                exit_code = 0
+            finally:
+                os._exit(exit_code)
+        children[pid] = worker_id
+        logger.info(f"👷 Worker {worker_id} avviato (pid {pid})")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for worker_id in range(workers):
+        spawn(worker_id)
+
+    logger.info(f"🚀 Prefork: {workers} worker su http://{host}:{port}")
+    next_report = time.monotonic() + 15
+
+    while children or (respawn_at and not stopping):
+        try:
+            pid, exit_status = os.waitpid(-1, os.WNOHANG) if children else (0, 0)
+        except ChildProcessError:
+            pid, exit_status = 0, 0
+            children.clear()
+
+        if pid:
+            worker_id = children.pop(pid, None)
+            if worker_id is None or stopping:
+                continue
+
+            # Worker morto inaspettatamente: riavvio con backoff, o stop se va in crash di continuo
+            now = time.monotonic()
+            recent = restarts.setdefault(worker_id, deque())
+            while recent and recent[0] < now - PREFORK_RESTART_WINDOW:
+                recent.popleft()
+            if len(recent) >= PREFORK_MAX_RESTARTS:
+                logger.error(
+                    f"❌ Worker {worker_id} (pid {pid}) terminato ({describe_exit(exit_status)}): "
+                    f"{len(recent)} riavvii in {PREFORK_RESTART_WINDOW}s, arresto del server"
+                )
+                failed = True
+                stop(signal.SIGTERM, None)
+                continue
+            recent.append(now)
+            delay = min(PREFORK_RESTART_BACKOFF_MAX, 2 ** (len(recent) - 1))
+            respawn_at[worker_id] = now + delay
+            logger.warning(
+                f"⚠️ Worker {worker_id} (pid {pid}) terminato ({describe_exit(exit_status)}), "
+                f"riavvio tra {delay:g}s"
+            )
+            continue
+
+        if not stopping:
+            now = time.monotonic()
+            for worker_id, when in list(respawn_at.items()):
+                if now >= when:
+                    del respawn_at[worker_id]
+                    spawn(worker_id)
+
+        if not stopping and time.monotonic() >= next_report:
+            report_memory(children)
+            next_report = time.monotonic() + MEMORY_REPORT_INTERVAL
+
+        time.sleep(0.5)
+
+    sock.close()
+    if failed:
+        raise SystemExit(1)
+    logger.info("👋 Prefork terminato")
+
+
+def report_memory(children: Dict[int, int]) -> None:
+    """Logga memoria condivisa e privata del master e di ogni worker"""
+    master = process_memory()
+    logger.info(
+        f"📊 Master: rss {master.get('rss_mb')} MB, privata {master.get('private_mb')} MB"
+    )
+    for pid, worker_id in sorted(children.items(), key=lambda item: item[1]):
+        mem = process_memory(str(pid))
+        logger.info(
+            f"📊 Worker {worker_id} (pid {pid}): condivisa {mem.get('shared_mb')} MB, "
+            f"privata {mem.get('private_mb')} MB, pss {mem.get('pss_mb')} MB"
+        )
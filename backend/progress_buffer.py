@@ -0,0 +1,169 @@
+"""
+Write-behind buffer for game progress
+Progress updates are coalesced in memory per (user, date, mode) and written
+in batched transactions; completed/won states are written immediately.
+The user stats aggregates are updated in the same transactions
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import AsyncSessionLocal, GameSession
+from user_stats import newly_completed, newly_started, record_completed_games, record_started_games
+
+logger = logging.getLogger(__name__)
+
+# Intervallo tra due flush delle sessioni non ancora concluse
+PROGRESS_FLUSH_INTERVAL_MS = int(os.getenv("PROGRESS_FLUSH_INTERVAL_MS", "2000"))
+
+ProgressKey = Tuple[int, str, str]  # (user_id, game_date, game_mode)
+
+
+def upsert_game_sessions(rows: List[dict]):
+    """
+    INSERT ... ON CONFLICT DO UPDATE per una o più sessioni.
+    L'aggiornamento è monotono (tentativi e stato non tornano mai indietro),
+    così un flush in ritardo non può sovrascrivere una partita già conclusa.
+    """
+    stmt = sqlite_insert(GameSession).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "game_date", "game_mode"],
+        set_={
+            "attempts": func.max(GameSession.attempts, stmt.excluded.attempts),
+            "completed": func.max(GameSession.completed, stmt.excluded.completed),
+            "won": func.max(GameSession.won, stmt.excluded.won),
+            "completed_at": func.coalesce(GameSession.completed_at, stmt.excluded.completed_at),
+        }
+    )
+
+
+class ProgressWriteBuffer:
+    """Buffer in memoria delle scritture su game_sessions"""
+
+    def __init__(self, flush_interval_ms: int = PROGRESS_FLUSH_INTERVAL_MS, session_factory=AsyncSessionLocal):
+        self.flush_interval = flush_interval_ms / 1000
+        self.session_factory = session_factory
+        self._pending: Dict[ProgressKey, dict] = {}
+        self._write_lock = asyncio.Lock()  # un solo writer: flush e scritture immediate in ordine
+        self._task: Optional[asyncio.Task] = None
+
+        # Metriche
+        self.updates = 0
+        self.commits = 0
+        self.rows_written = 0
+        self.last_flush_ms = 0.0
+
+    async def put(
+        self,
+        user_id: int,
+        game_date: str,
+        game_mode: str,
+        attempts: int,
+        completed: bool,
+        won: bool
+    ) -> None:
+        """Registra il progresso; le partite concluse vengono scritte subito"""
+        now = datetime.now(timezone.utc)
+        key = (user_id, game_date, game_mode)
+        row = {
+            "user_id": user_id,
+            "game_date": game_date,
+            "game_mode": game_mode,
+            "attempts": attempts,
+            "completed": completed,
+            "won": won,
+            "created_at": now,
+            "completed_at": now if completed else None,
+        }
+        self.updates += 1
+
+        if completed or won:
+            # Stato finale: durabile prima di rispondere al client
+            self._pending.pop(key, None)
+            await self._write([row], final=True)
+        else:
+            # Sovrascrive l'eventuale aggiornamento precedente non ancora scritto
+            self._pending[key] = row
+
+    def discard_user(self, user_id: int) -> List[ProgressKey]:
+        """Account eliminato: scarta gli aggiornamenti in attesa dell'utente e ritorna le loro chiavi"""
+        keys = [key for key in self._pending if key[0] == user_id]
+        for key in keys:
+            del self._pending[key]
+        return keys
+
+    async def flush(self) -> int:
+        """Scrive tutti gli aggiornamenti in attesa in un'unica transazione"""
+        if not self._pending:
+            return 0
+
+        pending, self._pending = self._pending, {}
+        try:
+            await self._write(list(pending.values()))
+        except Exception:
+            # Rimette in coda quello che non è stato superato da aggiornamenti più recenti
+            for key, row in pending.items():
+                self._pending.setdefault(key, row)
+            raise
+        return len(pending)
+
+    async def _write(self, rows: List[dict], final: bool = False) -> None:
+        async with self._write_lock:
+            start = time.perf_counter()
+            async with self.session_factory() as db:
+                # Partita iniziata o conclusa per la prima volta: aggiorna anche gli aggregati
+                started = await newly_started(db, rows)
+                completed = await newly_completed(db, rows) if final else []
+                await db.execute(upsert_game_sessions(rows))
+                if started:
+                    await record_started_games(db, started)
+                if completed:
+                    await record_completed_games(db, completed)
+                await db.commit()
+            self.commits += 1
+            self.rows_written += len(rows)
+            self.last_flush_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ Errore flush progressi: {e}")
+
+    def start(self) -> None:
+        """Avvia il flush periodico (da chiamare nello startup dell'app)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Ferma il flush periodico e scrive quello che resta (shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "updates": self.updates,
+            "commits": self.commits,
+            "rows_written": self.rows_written,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+# Istanza globale usata da /api/game/progress
+progress_buffer = ProgressWriteBuffer()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Server RESP minimale (stand-in di Redis) per sviluppo e test
+Implementa solo i comandi usati da RedisBackend, in memoria, su un solo thread:
+i blocchi MULTI/EXEC sono quindi atomici come in Redis.
+
+Uso:
+  python resp_server.py [porta]
+  STATE_BACKEND=redis STATE_REDIS_URL=redis://localhost:6380/0 python main.py
+"""
+
+import sys
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def encode_reply(value: Any) -> bytes:
+    """Risposta nel formato RESP"""
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, Exception):
+        return f"-ERR {value}\r\n".encode("utf-8")
+    if isinstance(value, bool):
+        return b":%d\r\n" % int(value)
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode_reply(v) for v in value)
+    if value in ("OK", "QUEUED", "PONG"):
+        return f"+{value}\r\n".encode("utf-8")
+    data = str(value).encode("utf-8")
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+# Comandi che modificano la chiave (il primo argomento, tutti per DEL): invalidano WATCH
+WRITE_COMMANDS = {"SET", "DEL", "EXPIRE", "PEXPIRE", "HSET", "HINCRBY", "ZADD"}
+
+
+def score_bound(bound: str):
+    """Estremo di ZRANGEBYSCORE ("-inf", "+inf", "5", "(5" esclusivo) come funzione di confronto"""
+    exclusive = bound.startswith("(")
+    limit = float(bound.lstrip("("))
+
+    def check(score: float, lower: bool) -> bool:
+        if lower:
+            return score > limit if exclusive else score >= limit
+        return score < limit if exclusive else score <= limit
+
+    return check
+
+
+class SortedSet(dict):
+    """Sorted set: membro -> punteggio (ordinato in lettura)"""
+
+
+class RESPStore:
+    """Dati del server: chiave -> stringa, hash o sorted set, con scadenza opzionale"""
+
+    def __init__(self):
+        self.data: Dict[str, Any] = {}
+        self.expires: Dict[str, float] = {}
+        self.modified: Dict[str, int] = {}  # scritture per chiave (WATCH)
+        self.flushes = 0
+
+    def _touch(self, key: str) -> None:
+        self.modified[key] = self.modified.get(key, 0) + 1
+
+    def _alive(self, key: str) -> bool:
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+            self._touch(key)
+        return key in self.data
+
+    def _typed(self, key: str, kind: type) -> dict:
+        if not self._alive(key):
+            self.data[key] = kind()
+        value = self.data[key]
+        if type(value) is not kind:
+            raise ValueError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def _hash(self, key: str) -> dict:
+        return self._typed(key, dict)
+
+    def watch_token(self, key: str) -> tuple:
+        """Cambia a ogni scrittura, scadenza o FLUSHALL della chiave"""
+        self._alive(key)
+        return self.modified.get(key, 0), self.flushes
+
+    def execute(self, args: List[str]) -> Any:
+        command, args = args[0].upper(), args[1:]
+        if command in WRITE_COMMANDS:
+            for key in args if command == "DEL" else args[:1]:
+                self._touch(key)
+
+        if command == "PING":
+            return args[0] if args else "PONG"
+        if command in ("AUTH", "SELECT"):
+            return "OK"
+        if command == "FLUSHALL":
+            self.data.clear()
+            self.expires.clear()
+            self.flushes += 1
+            return "OK"
+        if command == "DBSIZE":
+            return sum(1 for key in list(self.data) if self._alive(key))
+        if command == "GET":
+            value = self.data.get(args[0]) if self._alive(args[0]) else None
+            if isinstance(value, dict):
+                raise ValueError("WRONGTYPE Operation against a key holding the wrong kind of value")
+            return value
+        if command == "SET":
+            key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+            self.data[key] = value
+            self.expires.pop(key, None)
+            if "EX" in options:
+                self.expires[key] = time.monotonic() + int(args[2 + options.index("EX") + 1])
+            if "PX" in options:
+                self.expires[key] = time.monotonic() + int(args[2 + options.index("PX") + 1]) / 1000
+            return "OK"
+        if command == "DEL":
+            removed = 0
+            for key in args:
+                if self._alive(key):
+                    removed += 1
+                self.data.pop(key, None)
+                self.expires.pop(key, None)
+            return removed
+        if command in ("EXPIRE", "PEXPIRE"):
+            if not self._alive(args[0]):
+                return 0
+            seconds = int(args[1]) / (1000 if command == "PEXPIRE" else 1)
+            self.expires[args[0]] = time.monotonic() + seconds
+            return 1
+        if command == "HSET":
+            value = self._hash(args[0])
+            added = 0
+            for field, field_value in zip(args[1::2], args[2::2]):
+                added += field not in value
+                value[field] = field_value
+            return added
+        if command == "HGET":
+            return self._hash(args[0]).get(args[1]) if self._alive(args[0]) else None
+        if command == "HMGET":
+            value = self._hash(args[0]) if self._alive(args[0]) else {}
+            return [value.get(field) for field in args[1:]]
+        if command == "HGETALL":
+            if not self._alive(args[0]):
+                return []
+            return [item for pair in self._hash(args[0]).items() for item in pair]
+        if command == "HINCRBY":
+            value = self._hash(args[0])
+            value[args[1]] = str(int(value.get(args[1], 0)) + int(args[2]))
+            return int(value[args[1]])
+        if command == "ZADD":
+            value = self._typed(args[0], SortedSet)
+            added = 0
+            for score, member in zip(args[1::2], args[2::2]):
+                added += member not in value
+                value[member] = float(score)
+            return added
+        if command == "ZRANGEBYSCORE":
+            value = self._typed(args[0], SortedSet) if self._alive(args[0]) else {}
+            low, high = (score_bound(bound) for bound in args[1:3])
+            return [
+                member for member, score in sorted(value.items(), key=lambda item: (item[1], item[0]))
+                if low(score, True) and high(score, False)
+            ]
+
+        raise ValueError(f"unknown command '{command}'")
+
+
+class RESPServer:
+    def __init__(self, store: Optional[RESPStore] = None):
+        self.store = store or RESPStore()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        queued: Optional[List[List[str]]] = None  # comandi in attesa di EXEC
+        watched: Dict[str, tuple] = {}  # chiave -> watch_token al momento di WATCH
+        try:
+            while True:
+                args = await self.read_command(reader)
+                if args is None:
+                    break
+
+                command = args[0].upper()
+                if command == "MULTI":
+                    queued = []
+                    reply = "OK"
+                elif command == "EXEC":
+                    if queued is None:
+                        reply = ValueError("EXEC without MULTI")
+                    elif any(self.store.watch_token(key) != token for key, token in watched.items()):
+                        reply = None  # chiave osservata modificata: transazione annullata
+                    else:
+                        reply = [self.run(c) for c in queued]
+                    queued = None
+                    watched = {}
+                elif command == "DISCARD":
+                    queued = None
+                    watched = {}
+                    reply = "OK"
+                elif command == "WATCH" and queued is None:
+                    watched.update((key, self.store.watch_token(key)) for key in args[1:])
+                    reply = "OK"
+                elif command == "UNWATCH":
+                    watched = {}
+                    reply = "OK"
+                elif queued is not None:
+                    queued.append(args)
+                    reply = "QUEUED"
+                else:
+                    reply = self.run(args)
+
+                writer.write(encode_reply(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def run(self, args: List[str]) -> Any:
+        try:
+            return self.store.execute(args)
+        except (ValueError, IndexError) as e:
+            return e
+
+    @staticmethod
+    async def read_command(reader: asyncio.StreamReader) -> Optional[List[str]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.decode("utf-8").split()  # comando inline (telnet)
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2].decode("utf-8"))
+        return args
+
+
+async def serve(host: str = "127.0.0.1", port: int = 6380) -> asyncio.AbstractServer:
+    server = await asyncio.start_server(RESPServer().handle, host, port)
+    logger.info(f"🧪 Server RESP su {host}:{port}")
+    return server
+
+
+async def main(port: int) -> None:
+    server = await serve(port=port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 6380))
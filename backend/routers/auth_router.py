@@ -4,10 +4,11 @@ Authentication routes for Hot and Cold Game
 """
 
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db, User, GameSession, Friendship
+from database import get_db, get_async_db, User, GameSession, Friendship, UserStats
 from auth import (
     UserCreate,
     UserLogin,
@@ -19,14 +20,24 @@ from auth import (
     get_user_by_username,
     get_user_by_email,
     get_current_user_required,
+    invalidate_user,
+    login_ip_throttle,
+    login_username_throttle,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from friend_graph import friend_graph
+from progress_buffer import progress_buffer
+from routers.game_router import remove_player
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
 
+def client_host(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
 @router.post("/register", response_model=Token)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Register a new user
 
@@ -65,22 +76,27 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
 
     # Check if username exists
-    if get_user_by_username(db, username):
+    if await get_user_by_username(db, username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username già in uso"
         )
 
     # Check if email exists
-    if user_data.email and get_user_by_email(db, user_data.email.lower()):
+    if user_data.email and await get_user_by_email(db, user_data.email.lower()):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email già registrata"
         )
 
+    # Ogni registrazione costa un hash bcrypt: conta nel limite dell'IP
+    client_ip = client_host(request)
+    login_ip_throttle.check(client_ip)
+    login_ip_throttle.hit(client_ip)
+
     # Create user
     user_data.username = username
-    db_user = create_user(db, user_data)
+    db_user = await create_user(db, user_data)
 
     # Create token (sub must be a string for JWT standard)
     access_token = create_access_token(
@@ -96,22 +112,34 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=Token)
-async def login(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login(user_data: UserLogin, request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Login with username/email and password
 
     - **username**: Username or email
     - **password**: Password
+
+    Too many attempts from the same IP, or failures for the same username,
+    are answered with 429 before any password check.
     """
-    user = authenticate_user(db, user_data.username, user_data.password)
+    client_ip = client_host(request)
+    username_key = user_data.username.lower().strip()
+    login_ip_throttle.check(client_ip)
+    login_username_throttle.check(username_key)
+    login_ip_throttle.hit(client_ip)
+
+    user = await authenticate_user(db, user_data.username, user_data.password)
 
     if not user:
+        login_username_throttle.hit(username_key)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Credenziali non valide",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    login_username_throttle.reset(username_key)
+
     # Create token (sub must be a string for JWT standard)
     access_token = create_access_token(
         data={"sub": str(user.id)},
@@ -156,26 +184,32 @@ async def delete_account(
     """
     Elimina definitivamente l'account dell'utente e tutti i dati associati.
     """
-    import os
-
     user_id = current_user.id
 
-    # Elimina tutte le sessioni di gioco
+    # Partite giocate (anche quelle non ancora scritte dal buffer, che vengono scartate),
+    # per togliere l'utente dalle classifiche live
+    played = {(game_date, game_mode) for _, game_date, game_mode in progress_buffer.discard_user(user_id)}
+    played.update(
+        db.query(GameSession.game_date, GameSession.game_mode).filter(GameSession.user_id == user_id).distinct()
+    )
+    game_keys = [f"{game_date}_{game_mode}" for game_date, game_mode in played]
+
+    # Elimina tutte le sessioni di gioco e i loro aggregati
     db.query(GameSession).filter(GameSession.user_id == user_id).delete()
+    db.query(UserStats).filter(UserStats.user_id == user_id).delete()
 
     # Elimina tutte le amicizie (sia come user che come friend)
     db.query(Friendship).filter(
         (Friendship.user_id == user_id) | (Friendship.friend_id == user_id)
     ).delete()
 
-    # Elimina l'avatar se esiste
-    if current_user.avatar_path:
-        avatar_file = f"/opt/semantico{current_user.avatar_path}"
-        if os.path.exists(avatar_file):
-            os.remove(avatar_file)
-
-    # Elimina l'utente
-    db.delete(current_user)
+    # Elimina l'utente (ricaricato in questa sessione)
+    user = db.get(User, user_id)
+    if user:
+        db.delete(user)
     db.commit()
+    invalidate_user(user_id)
+    friend_graph.forget(user_id)
+    await remove_player(user_id, game_keys)
 
     return {"message": "Account eliminato con successo"}
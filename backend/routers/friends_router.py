@@ -7,11 +7,13 @@ from datetime import datetime, timezone
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, case, or_, select
 from pydantic import BaseModel
 
-from database import get_db, User, Friendship, FriendshipStatus
+from database import get_db, get_async_read_db, User, Friendship, FriendshipStatus
 from auth import get_current_user_required
+from friend_graph import friend_graph
 
 router = APIRouter(prefix="/api/friends", tags=["Friends"])
 
@@ -38,7 +40,7 @@ class FriendRequestResponse(BaseModel):
 @router.get("")
 async def get_friends(
     current_user: User = Depends(get_current_user_required),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ) -> dict:
     """
     Get list of friends and pending requests.
@@ -47,42 +49,44 @@ async def get_friends(
     - pending_sent: Requests you sent that are pending
     - pending_received: Requests you received that are pending
     """
-    # Get all friendships involving current user
-    friendships = db.query(Friendship).filter(
-        or_(
+    # Amicizie in entrambe le direzioni con l'altro utente, in una sola query
+    other_id = case(
+        (Friendship.user_id == current_user.id, Friendship.friend_id),
+        else_=Friendship.user_id
+    )
+    result = await db.execute(
+        select(
+            Friendship.id,
+            Friendship.user_id,
+            Friendship.status,
+            User.id.label("other_id"),
+            User.username,
+            User.avatar_path
+        )
+        .join(User, User.id == other_id)
+        .where(or_(
             Friendship.user_id == current_user.id,
             Friendship.friend_id == current_user.id
-        )
-    ).all()
+        ))
+    )
 
     friends = []
     pending_sent = []
     pending_received = []
 
-    for f in friendships:
-        # Determine the other user
-        if f.user_id == current_user.id:
-            other_user = db.query(User).filter(User.id == f.friend_id).first()
-            is_sender = True
-        else:
-            other_user = db.query(User).filter(User.id == f.user_id).first()
-            is_sender = False
-
-        if not other_user:
-            continue
-
+    for row in result:
         friend_data = FriendResponse(
-            id=other_user.id,
-            username=other_user.username,
-            avatar_path=other_user.avatar_path,
-            status=f.status.value,
-            friendship_id=f.id
+            id=row.other_id,
+            username=row.username,
+            avatar_path=row.avatar_path,
+            status=row.status.value,
+            friendship_id=row.id
         )
 
-        if f.status == FriendshipStatus.ACCEPTED:
+        if row.status == FriendshipStatus.ACCEPTED:
             friends.append(friend_data)
-        elif f.status == FriendshipStatus.PENDING:
-            if is_sender:
+        elif row.status == FriendshipStatus.PENDING:
+            if row.user_id == current_user.id:
                 pending_sent.append(friend_data)
             else:
                 pending_received.append(friend_data)
@@ -185,6 +189,7 @@ async def accept_friend_request(
 
     friendship.status = FriendshipStatus.ACCEPTED
     db.commit()
+    friend_graph.add(friendship.user_id, friendship.friend_id)
 
     return {"message": "Richiesta di amicizia accettata"}
 
@@ -239,7 +244,10 @@ async def remove_friend(
             detail="Amicizia non trovata"
         )
 
+    was_accepted = friendship.status == FriendshipStatus.ACCEPTED
     db.delete(friendship)
     db.commit()
+    if was_accepted:
+        friend_graph.remove(friendship.user_id, friendship.friend_id)
 
     return {"message": "Amicizia rimossa"}
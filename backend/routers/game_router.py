@@ -3,15 +3,34 @@ Game routes for Hot and Cold Game
 /api/game/* endpoints for tracking progress and stats
 """
 
-from datetime import datetime, timezone
-from typing import Optional, List
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+import json
+import base64
+import time
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from typing import FrozenSet, Iterable, Optional, List, Tuple
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, and_, case, select
 from pydantic import BaseModel
-
-from database import get_db, User, GameSession, Friendship, FriendshipStatus
-from auth import get_current_user_required, get_current_user
+from starlette.concurrency import run_in_threadpool
+
+from archive import today_utc, validate_game_date
+from database import (
+    get_db, get_read_db, get_async_read_db, ReadSessionLocal, AsyncReadSessionLocal,
+    User, GameSession, Friendship, FriendshipStatus, UserStats
+)
+from auth import get_current_user_required, get_current_user, get_current_user_unscoped
+from friend_graph import friend_graph
+from leaderboard import REMOVED, Leaderboard
+from live_updates import LIVE_KEEPALIVE_SECONDS, progress_hub
+from progress_buffer import progress_buffer
+from state_backend import state_backend
+from state_store import TTLStore
+from user_stats import ALL_MODES, displayed_streak, new_user_stats
 
 router = APIRouter(prefix="/api/game", tags=["Game"])
 
@@ -48,38 +67,221 @@ class GameStatsResponse(BaseModel):
     total_hints: int = 0
 
 
-# In-memory storage for real-time progress (could use Redis in production)
-# Format: {game_date: {user_id: {best_rank, attempts, completed, won}}}
-active_players: dict = {}
+# Una classifica resta in memoria fino a fine giornata (+1 giorno per i fusi orari)
+# e comunque almeno ACTIVE_BOARD_IDLE_SECONDS dall'ultimo accesso (partite d'archivio)
+ACTIVE_BOARD_IDLE_SECONDS = int(os.getenv("ACTIVE_BOARD_IDLE_SECONDS", "21600"))
+ACTIVE_BOARDS_MAX = int(os.getenv("ACTIVE_BOARDS_MAX", "500"))
+
+# Con uno stato condiviso (STATE_BACKEND sqlite/redis) ogni worker riallinea la sua
+# copia della classifica al massimo una volta ogni STATE_SYNC_INTERVAL_MS
+STATE_SYNC_INTERVAL_MS = int(os.getenv("STATE_SYNC_INTERVAL_MS", "500"))
+
+# Pagine di /history (default e massimo) e blocchi dell'export NDJSON
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "100"))
+HISTORY_PAGE_SIZE_MAX = int(os.getenv("HISTORY_PAGE_SIZE_MAX", "500"))
+HISTORY_EXPORT_BATCH = 500
+
+# In-memory storage for real-time progress
+# Format: {"{game_date}_{game_mode}": Leaderboard} (classifica ordinata per partita).
+# Con uno stato condiviso è una cache locale dell'hash "board:{game_key}" del backend
+active_players = TTLStore(
+    "active_players",
+    default_ttl=ACTIVE_BOARD_IDLE_SECONDS,
+    maxsize=ACTIVE_BOARDS_MAX,
+    sizeof=lambda key, board: board.memory_bytes()
+)
+
+
+def board_ttl(game_date: str) -> float:
+    """Secondi di vita della classifica di una data, a partire da adesso"""
+    try:
+        day_end = datetime.combine(date.fromisoformat(game_date), datetime.min.time(), timezone.utc)
+    except ValueError:
+        return ACTIVE_BOARD_IDLE_SECONDS
+    remaining = (day_end + timedelta(days=2) - datetime.now(timezone.utc)).total_seconds()
+    return max(remaining, ACTIVE_BOARD_IDLE_SECONDS)
+
+
+async def sync_board(board: Leaderboard, game_key: str, force: bool = False) -> bool:
+    """
+    Stato condiviso: applica alla classifica locale le entry scritte dagli
+    altri worker dopo la sua versione. Ritorna True se qualcosa è cambiato.
+    """
+    now = time.monotonic()
+    if not force and now - board.synced_at < STATE_SYNC_INTERVAL_MS / 1000:
+        return False
+    board.synced_at = now
+
+    # I/O verso SQLite/Redis: fuori dall'event loop
+    version, fields = await run_in_threadpool(state_backend.hash_since, f"board:{game_key}", board.version)
+    # Una lettura concorrente più recente è già stata applicata
+    if version <= board.version:
+        return False
+    return board.apply({int(user_id): raw for user_id, raw in fields.items()}, version) > 0
+
+
+async def sync_watched_boards(game_keys) -> None:
+    """Tick dello stream live: notifica i cambiamenti fatti dagli altri worker"""
+    for game_key in game_keys:
+        board = active_players.get(game_key)
+        if board is not None and board.ready.is_set() and await sync_board(board, game_key):
+            progress_hub.publish(game_key)
+
+
+if state_backend.shared:
+    progress_hub.poll = sync_watched_boards
+
+# Amicizia aggiunta o rimossa in questo worker: gli stream live dei due utenti
+# ricevono la classifica completa con is_friend ricalcolato
+friend_graph.on_change = progress_hub.friends_changed
+
+
+async def get_leaderboard(db: AsyncSession, game_date: str, game_mode: str) -> Leaderboard:
+    """
+    Classifica della partita; alla prima richiesta viene caricata dal DB
+    (giocatori che hanno giocato ma non sono in memoria), poi è aggiornata
+    solo dalle scritture di progresso.
+    """
+    game_key = f"{game_date}_{game_mode}"
+    board = active_players.get(game_key)
+
+    if board is None:
+        # Con lo stato condiviso la versione è quella del backend (uguale per tutti i worker).
+        # Registrata subito, così le richieste concorrenti aspettano questo caricamento
+        board = Leaderboard(version=0 if state_backend.shared else None)
+        active_players.set(game_key, board, ttl=board_ttl(game_date))
+        try:
+            result = await db.execute(select(GameSession, User).join(User).where(
+                GameSession.game_date == game_date,
+                GameSession.game_mode == game_mode
+            ))
+            for session, user in result.all():
+                # Arrivato un progresso durante il caricamento: quello è più preciso
+                if user.id in board:
+                    continue
+
+                # For completed games from DB, we don't have best_rank stored
+                # Use attempts as proxy (lower is better)
+                board.upsert({
+                    "user_id": user.id,
+                    "username": user.username,
+                    "avatar_path": user.avatar_path,
+                    "best_rank": session.attempts * 100 if session.won else 99999,  # Estimate
+                    "attempts": session.attempts,
+                    "completed": session.completed,
+                    "won": session.won,
+                    "hints_used": session.hints_used or 0
+                }, version=0 if state_backend.shared else None)
+
+            if state_backend.shared:
+                await sync_board(board, game_key, force=True)
+                board.reset_log()
+        except BaseException:
+            # Caricamento fallito (o richiesta annullata): niente classifica vuota o parziale
+            # in memoria, la prossima richiesta riprova
+            if active_players.get(game_key) is board:
+                active_players.pop(game_key)
+            raise
+        finally:
+            board.ready.set()
+    else:
+        active_players.touch(game_key, board_ttl(game_date))
+        await board.ready.wait()
+        if active_players.get(game_key) is not board:
+            # Il caricamento atteso è fallito: riprova questa richiesta
+            return await get_leaderboard(db, game_date, game_mode)
+        if state_backend.shared:
+            await sync_board(board, game_key)
+
+    return board
+
+
+async def remove_player(user_id: int, game_keys: Iterable[str] = ()) -> None:
+    """
+    Account eliminato: toglie il giocatore dalle classifiche in memoria, così i
+    client in polling lo ricevono in "removed". Con lo stato condiviso scrive
+    REMOVED nell'hash delle classifiche in memoria e delle partite `game_keys`
+    ("{data}_{modalità}" giocate dall'utente): gli altri worker lo tolgono al
+    prossimo allineamento, le classifiche caricate dopo non lo trovano nel DB.
+    """
+    local_keys = [game_key for game_key, board in active_players.items() if user_id in board]
+
+    if not state_backend.shared:
+        for game_key in local_keys:
+            board = active_players.get(game_key)
+            if board is not None:
+                board.remove(user_id)
+                progress_hub.publish(game_key)
+        return
+
+    for game_key in set(local_keys) | set(game_keys):
+        game_date = game_key.split("_", 1)[0]
+        await run_in_threadpool(
+            state_backend.hash_put, f"board:{game_key}", str(user_id), REMOVED, board_ttl(game_date)
+        )
+        board = active_players.get(game_key)
+        if board is not None:
+            board.synced_at = 0.0
+        progress_hub.publish(game_key)
+
+
+async def load_friend_ids(db: AsyncSession, user_id: int) -> set:
+    """ID degli amici (amicizie accettate, in entrambe le direzioni) letti dal DB"""
+    result = await db.execute(select(
+        case((Friendship.user_id == user_id, Friendship.friend_id), else_=Friendship.user_id)
+    ).where(
+        and_(
+            Friendship.status == FriendshipStatus.ACCEPTED,
+            (Friendship.user_id == user_id) | (Friendship.friend_id == user_id)
+        )
+    ))
+
+    return set(result.scalars())
+
+
+async def get_friend_ids(db: AsyncSession, user_id: int) -> FrozenSet[int]:
+    """ID degli amici dal grafo in memoria (query solo al primo accesso dell'utente)"""
+    return await friend_graph.get(user_id, lambda uid: load_friend_ids(db, uid))
+
+
+async def reload_friend_ids(user_id: int) -> FrozenSet[int]:
+    """Come get_friend_ids, con una sessione aperta solo se servono dal DB (stream live)"""
+    async def load(uid: int) -> set:
+        async with AsyncReadSessionLocal() as db:
+            return await load_friend_ids(db, uid)
+
+    return await friend_graph.get(user_id, load)
 
 
 @router.post("/progress")
 async def update_progress(
     request: UpdateProgressRequest,
     current_user: User = Depends(get_current_user_required),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Update player progress for a game session.
     Called after each guess to update the player's position on the progress bar.
+    The DB write goes through the write-behind buffer (immediate when completed/won).
     """
-    game_key = f"{request.game_date}_{request.game_mode}"
-
-    # Prima controlla se esiste una sessione nel DB per prendere hints_used
-    existing_session = db.query(GameSession).filter(
-        GameSession.user_id == current_user.id,
-        GameSession.game_date == request.game_date,
-        GameSession.game_mode == request.game_mode
-    ).first()
-
-    # Prendi hints_used dal DB se esiste, altrimenti 0
-    current_hints = existing_session.hints_used if existing_session and hasattr(existing_session, 'hints_used') else 0
+    # Solo date dell'archivio: niente sessioni né classifiche per date arbitrarie
+    request.game_date = validate_game_date(request.game_date)
+
+    await progress_buffer.put(
+        user_id=current_user.id,
+        game_date=request.game_date,
+        game_mode=request.game_mode,
+        attempts=request.attempts,
+        completed=request.completed,
+        won=request.won
+    )
 
-    # Update in-memory storage for real-time display
-    if game_key not in active_players:
-        active_players[game_key] = {}
+    # Classifica della partita (hints_used dal record già presente)
+    game_key = f"{request.game_date}_{request.game_mode}"
+    board = await get_leaderboard(db, request.game_date, request.game_mode)
+    previous = board.get(current_user.id)
 
-    active_players[game_key][current_user.id] = {
+    entry = {
         "user_id": current_user.id,
         "username": current_user.username,
         "avatar_path": current_user.avatar_path,
@@ -87,205 +289,320 @@ async def update_progress(
         "attempts": request.attempts,
         "completed": request.completed,
         "won": request.won,
-        "hints_used": current_hints,
+        "hints_used": previous.get("hints_used", 0) if previous else 0,
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
 
-    # Update/create session nel DB
-    if existing_session:
-        existing_session.attempts = request.attempts
-        existing_session.completed = request.completed
-        existing_session.won = request.won
-        if request.completed:
-            existing_session.completed_at = datetime.now(timezone.utc)
-    else:
-        existing_session = GameSession(
-            user_id=current_user.id,
-            game_date=request.game_date,
-            game_mode=request.game_mode,
-            attempts=request.attempts,
-            completed=request.completed,
-            won=request.won
+    if state_backend.shared:
+        # La classifica locale si riallinea dallo store (stesso ordine di versioni
+        # per tutti i worker) alla prossima lettura o al prossimo tick live
+        await run_in_threadpool(
+            state_backend.hash_put,
+            f"board:{game_key}", str(current_user.id), json.dumps(entry), board_ttl(request.game_date)
         )
-        db.add(existing_session)
-
-    db.commit()
+        board.synced_at = 0.0
+    else:
+        board.upsert(entry)
+    progress_hub.publish(game_key)
 
     return {"status": "ok"}
 
 
-@router.get("/players/{game_date}")
+@router.get("/players/{game_date}", response_model=List[PlayerProgress])
 async def get_active_players(
     game_date: str,
     game_mode: str = "daily",
     friends_only: bool = False,
+    since: Optional[int] = None,
     current_user: Optional[User] = Depends(get_current_user),
-    db: Session = Depends(get_db)
-) -> List[PlayerProgress]:
+    db: AsyncSession = Depends(get_async_read_db)
+):
     """
     Get list of players currently playing or who played this game.
-    Returns their progress (position on the hot-cold bar).
+    Returns their progress (position on the hot-cold bar), best players first.
+    Served from the incremental leaderboard as pre-serialized JSON.
+
+    The board version is in the X-Board-Version header. With ?since=<version>
+    only the players changed after that version are returned, as
+    {"version", "full", "players", "removed"}, or 304 if nothing changed;
+    the full board if the viewer's friends changed since then.
     """
-    game_key = f"{game_date}_{game_mode}"
+    # Date non valide: 400, senza creare una classifica in memoria
+    game_date = validate_game_date(game_date)
+    board = await get_leaderboard(db, game_date, game_mode)
+    viewer_id = current_user.id if current_user else None
+
+    # Amici cambiati dopo `since`: is_friend (e friends_only) vanno riletti per tutti
+    friends_changed = (
+        since is not None and viewer_id is not None
+        and board.friends_changed(viewer_id, since, friend_graph.changed_at(viewer_id))
+    )
+
+    if since is not None and since == board.version and not friends_changed:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"X-Board-Version": str(board.version)}
+        )
 
     # Get friend IDs if user is authenticated
-    friend_ids = set()
-    if current_user:
-        friendships = db.query(Friendship).filter(
-            and_(
-                Friendship.status == FriendshipStatus.ACCEPTED,
-                (Friendship.user_id == current_user.id) | (Friendship.friend_id == current_user.id)
-            )
-        ).all()
-
-        for f in friendships:
-            if f.user_id == current_user.id:
-                friend_ids.add(f.friend_id)
-            else:
-                friend_ids.add(f.user_id)
-
-    players = []
-
-    # Get from in-memory storage (active players)
-    if game_key in active_players:
-        for user_id, data in active_players[game_key].items():
-            # Filter by friends if requested
-            if friends_only and current_user:
-                if user_id not in friend_ids and user_id != current_user.id:
-                    continue
+    friend_ids = await get_friend_ids(db, current_user.id) if current_user else set()
 
-            players.append(PlayerProgress(
-                user_id=data["user_id"],
-                username=data["username"],
-                avatar_path=data["avatar_path"],
-                best_rank=data["best_rank"],
-                attempts=data["attempts"],
-                completed=data["completed"],
-                won=data["won"],
-                is_friend=user_id in friend_ids,
-                hints_used=data.get("hints_used", 0)
-            ))
+    if since is not None:
+        content = board.render_delta(since, friend_ids, viewer_id, friends_only, full=friends_changed)
+        if friends_changed:
+            board.friends_served(viewer_id)
+    else:
+        content = board.render(friend_ids, viewer_id, friends_only)
 
-    # Also get from database (players who completed but aren't in memory)
-    db_sessions = db.query(GameSession, User).join(User).filter(
-        GameSession.game_date == game_date,
-        GameSession.game_mode == game_mode
-    ).all()
+    return Response(
+        content=content,
+        media_type="application/json",
+        headers={"X-Board-Version": str(board.version)}
+    )
 
-    existing_ids = {p.user_id for p in players}
 
-    for session, user in db_sessions:
-        if user.id not in existing_ids:
-            if friends_only and current_user:
-                if user.id not in friend_ids and user.id != current_user.id:
-                    continue
+@router.get("/live/{game_date}")
+async def stream_active_players(
+    game_date: str,
+    game_mode: str = "daily",
+    friends_only: bool = False,
+    since: Optional[int] = None,
+    last_event_id: Optional[int] = Header(None),
+    current_user: Optional[User] = Depends(get_current_user_unscoped)
+):
+    """
+    Server-Sent Events stream of the players progress (push alternative to
+    polling GET /players/{game_date}, which stays available as fallback).
+    Every `progress` event carries the same body as ?since= (the event id is
+    the board version); the first one is the full board unless `since` or the
+    Last-Event-ID header of a reconnecting client points to a known version.
+    When the viewer's friends change, the next event is the full board.
+    """
+    game_date = validate_game_date(game_date)
+
+    # Sessione chiusa prima della risposta: lo stream non tiene una connessione del pool
+    async with AsyncReadSessionLocal() as db:
+        board = await get_leaderboard(db, game_date, game_mode)
+        friend_ids = await get_friend_ids(db, current_user.id) if current_user else set()
+    viewer_id = current_user.id if current_user else None
+
+    if progress_hub.full():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Troppe connessioni live, usa il polling"
+        )
 
-            # For completed games from DB, we don't have best_rank stored
-            # Use attempts as proxy (lower is better)
-            players.append(PlayerProgress(
-                user_id=user.id,
-                username=user.username,
-                avatar_path=user.avatar_path,
-                best_rank=session.attempts * 100 if session.won else 99999,  # Estimate
-                attempts=session.attempts,
-                completed=session.completed,
-                won=session.won,
-                is_friend=user.id in friend_ids,
-                hints_used=session.hints_used if hasattr(session, 'hints_used') else 0
-            ))
+    def event(version: int, full: bool = False) -> bytes:
+        content = board.render_delta(version, friend_ids, viewer_id, friends_only, full=full)
+        return b"id: " + str(board.version).encode() + b"\nevent: progress\ndata: " + content + b"\n\n"
 
-    # Sort by best_rank (best players first)
-    players.sort(key=lambda p: (not p.won, p.best_rank))
+    game_key = f"{game_date}_{game_mode}"
 
-    return players
+    async def events():
+        nonlocal friend_ids
+        version = since if since is not None else last_event_id
+        sub = progress_hub.subscribe(game_key, viewer_id)
+        try:
+            # Riconnessione dopo un cambio di amici: lista completa, come per ?since=
+            full = (
+                version is not None and viewer_id is not None
+                and board.friends_changed(viewer_id, version, friend_graph.changed_at(viewer_id))
+            )
+            if version != board.version or full:
+                yield event(version or 0, full)
+                version = board.version
+                if full:
+                    board.friends_served(viewer_id)
+
+            while True:
+                try:
+                    await asyncio.wait_for(sub.event.wait(), timeout=LIVE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Un client collegato tiene in memoria la classifica
+                    active_players.touch(game_key, board_ttl(game_date))
+                    yield b": keepalive\n\n"
+                    continue
+
+                # Chiusura del server o classifica rimossa dalla memoria:
+                # il client si riconnette e riceve la classifica completa
+                if progress_hub.closed or active_players.get(game_key) is not board:
+                    return
+
+                changed_at = sub.consume()
+                if sub.friends_changed:
+                    # Amici del lettore cambiati: is_friend e friends_only vanno ricalcolati per tutti
+                    sub.friends_changed = False
+                    friend_ids = await reload_friend_ids(viewer_id)
+                    yield event(version or 0, full=True)
+                    version = board.version
+                    board.friends_served(viewer_id)
+                    progress_hub.delivered(changed_at)
+                elif version != board.version:
+                    yield event(version)
+                    version = board.version
+                    progress_hub.delivered(changed_at)
+        finally:
+            progress_hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.get("/stats")
 async def get_user_stats(
     current_user: User = Depends(get_current_user_required),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> GameStatsResponse:
     """
     Get statistics for the current user.
+    Read from the user_stats aggregates (updated when a game is completed).
     """
-    sessions = db.query(GameSession).filter(
-        GameSession.user_id == current_user.id
-    ).order_by(GameSession.game_date.desc()).all()
-
-    total_games = len(sessions)
-    games_won = sum(1 for s in sessions if s.won)
-
-    # Calculate streaks
-    current_streak = 0
-    best_streak = 0
-    temp_streak = 0
-
-    for session in sessions:
-        if session.won:
-            temp_streak += 1
-            if temp_streak > best_streak:
-                best_streak = temp_streak
-        else:
-            if temp_streak == current_streak or current_streak == 0:
-                current_streak = temp_streak
-            temp_streak = 0
-
-    if temp_streak > 0 and current_streak == 0:
-        current_streak = temp_streak
+    rows = db.query(UserStats).filter(UserStats.user_id == current_user.id).all()
+    by_mode = {row.game_mode: row for row in rows}
+    overall = by_mode.pop(ALL_MODES, None) or new_user_stats(current_user.id, ALL_MODES)
 
     # Average attempts for won games
-    won_sessions = [s for s in sessions if s.won]
-    average_attempts = sum(s.attempts for s in won_sessions) / len(won_sessions) if won_sessions else 0
+    average_attempts = overall.won_attempts / overall.games_won if overall.games_won else 0
 
     # Games by mode
-    games_by_mode = {}
-    for session in sessions:
-        mode = session.game_mode
-        if mode not in games_by_mode:
-            games_by_mode[mode] = {"total": 0, "won": 0}
-        games_by_mode[mode]["total"] += 1
-        if session.won:
-            games_by_mode[mode]["won"] += 1
-
-    # Calcola totale hints usati
-    total_hints = sum(s.hints_used if hasattr(s, 'hints_used') else 0 for s in sessions)
+    games_by_mode = {
+        mode: {"total": row.games_played, "won": row.games_won}
+        for mode, row in by_mode.items()
+    }
 
     return GameStatsResponse(
-        total_games=total_games,
-        games_won=games_won,
-        current_streak=current_streak,
-        best_streak=best_streak,
+        total_games=overall.games_played,
+        games_won=overall.games_won,
+        current_streak=displayed_streak(overall, today_utc()),
+        best_streak=overall.best_streak,
         average_attempts=round(average_attempts, 1),
         games_by_mode=games_by_mode,
-        total_hints=total_hints
+        total_hints=overall.total_hints
     )
 
 
+def encode_history_cursor(game_date: str, session_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{game_date}|{session_id}".encode()).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        game_date, session_id = raw.split("|")
+        return game_date, int(session_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursore non valido")
+
+
+def history_query(
+    user_id: int,
+    game_mode: Optional[str] = None,
+    after: Optional[Tuple[str, int]] = None,
+    since_date: Optional[date] = None,
+    until_date: Optional[date] = None
+):
+    """
+    Sessioni dell'utente dalla più recente, in ordine (game_date, id) decrescente.
+    `after` è la chiave dell'ultima riga già letta (keyset: niente OFFSET);
+    since_date/until_date (inclusi) limitano le date
+    """
+    query = select(
+        GameSession.id,
+        GameSession.game_date,
+        GameSession.game_mode,
+        GameSession.attempts,
+        GameSession.completed,
+        GameSession.won,
+        GameSession.completed_at
+    ).where(GameSession.user_id == user_id)
+
+    if game_mode:
+        query = query.where(GameSession.game_mode == game_mode)
+    if since_date is not None:
+        query = query.where(GameSession.game_date >= since_date.isoformat())
+    if until_date is not None:
+        query = query.where(GameSession.game_date <= until_date.isoformat())
+    if after is not None:
+        last_date, last_id = after
+        query = query.where(
+            (GameSession.game_date < last_date)
+            | ((GameSession.game_date == last_date) & (GameSession.id < last_id))
+        )
+
+    return query.order_by(GameSession.game_date.desc(), GameSession.id.desc())
+
+
+def history_item(row) -> dict:
+    return {
+        "game_date": row.game_date,
+        "game_mode": row.game_mode,
+        "attempts": row.attempts,
+        "completed": row.completed,
+        "won": row.won,
+        "completed_at": row.completed_at.isoformat() if row.completed_at else None
+    }
+
+
 @router.get("/history")
 async def get_user_game_history(
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    game_mode: Optional[str] = None,
+    since_date: Optional[date] = None,
+    until_date: Optional[date] = None,
     current_user: User = Depends(get_current_user_required),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
-    Get complete game history for the current user.
-    Returns list of all games played with date, attempts, won status.
+    Get the game history for the current user, most recent first, one page at a time.
+    Returns list of games played with date, attempts, won status.
+    since_date/until_date (YYYY-MM-DD, inclusive) restrict the dates, e.g. to the
+    window a client is showing. When there are more games, the X-Next-Cursor
+    header holds the `cursor` for the next page. Use /history/export for a full download.
     """
-    sessions = db.query(GameSession).filter(
-        GameSession.user_id == current_user.id
-    ).order_by(GameSession.game_date.desc()).all()
-
-    history = []
-    for session in sessions:
-        history.append({
-            "game_date": session.game_date,
-            "game_mode": session.game_mode,
-            "attempts": session.attempts,
-            "completed": session.completed,
-            "won": session.won,
-            "completed_at": session.completed_at.isoformat() if session.completed_at else None
-        })
+    after = decode_history_cursor(cursor) if cursor else None
+    query = history_query(current_user.id, game_mode, after, since_date, until_date)
+    rows = db.execute(query.limit(limit + 1)).all()
 
-    return history
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_history_cursor(rows[-1].game_date, rows[-1].id)
+
+    return JSONResponse(content=[history_item(row) for row in rows], headers=headers)
+
+
+@router.get("/history/export")
+def export_user_game_history(
+    game_mode: Optional[str] = None,
+    current_user: User = Depends(get_current_user_required)
+):
+    """
+    Full game history as NDJSON (one JSON object per line), streamed in
+    keyset batches: memory use does not grow with the number of games.
+    """
+    user_id = current_user.id
+
+    def lines():
+        after = None
+        while True:
+            with ReadSessionLocal() as db:
+                rows = db.execute(history_query(user_id, game_mode, after).limit(HISTORY_EXPORT_BATCH)).all()
+            if not rows:
+                return
+            yield "".join(json.dumps(history_item(row), ensure_ascii=False) + "\n" for row in rows)
+            if len(rows) < HISTORY_EXPORT_BATCH:
+                return
+            after = (rows[-1].game_date, rows[-1].id)
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="hotncold_history.ndjson"'}
+    )
 
 
 @router.get("/friends/status/{game_date}")
@@ -293,51 +610,47 @@ async def get_friends_game_status(
     game_date: str,
     game_mode: str = "daily",
     current_user: User = Depends(get_current_user_required),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get game status for all friends (have they played? did they win? how many attempts?).
     """
-    # Get friend IDs
-    friendships = db.query(Friendship).filter(
-        and_(
-            Friendship.status == FriendshipStatus.ACCEPTED,
-            (Friendship.user_id == current_user.id) | (Friendship.friend_id == current_user.id)
-        )
-    ).all()
-
-    friend_ids = []
-    for f in friendships:
-        if f.user_id == current_user.id:
-            friend_ids.append(f.friend_id)
-        else:
-            friend_ids.append(f.user_id)
+    friend_ids = await get_friend_ids(db, current_user.id)
 
     if not friend_ids:
         return []
 
-    # Get friends and their game sessions
-    friends_status = []
-
-    for friend_id in friend_ids:
-        friend = db.query(User).filter(User.id == friend_id).first()
-        if not friend:
-            continue
-
-        session = db.query(GameSession).filter(
-            GameSession.user_id == friend_id,
+    # Amici e sessione del giorno in una sola query (outer join: chi non ha giocato resta)
+    result = await db.execute(
+        select(
+            User.id,
+            User.username,
+            User.avatar_path,
+            GameSession.id.label("session_id"),
+            GameSession.completed,
+            GameSession.won,
+            GameSession.attempts
+        )
+        .outerjoin(GameSession, and_(
+            GameSession.user_id == User.id,
             GameSession.game_date == game_date,
             GameSession.game_mode == game_mode
-        ).first()
+        ))
+        .where(User.id.in_(friend_ids))
+    )
+
+    friends_status = []
 
+    for row in result:
+        played = row.session_id is not None
         friends_status.append({
-            "user_id": friend.id,
-            "username": friend.username,
-            "avatar_path": friend.avatar_path,
-            "played": session is not None,
-            "completed": session.completed if session else False,
-            "won": session.won if session else False,
-            "attempts": session.attempts if session else None
+            "user_id": row.id,
+            "username": row.username,
+            "avatar_path": row.avatar_path,
+            "played": played,
+            "completed": row.completed if played else False,
+            "won": row.won if played else False,
+            "attempts": row.attempts if played else None
         })
 
     # Sort: completed first, then by attempts
@@ -4,60 +4,95 @@ User routes for Hot and Cold Game
 """
 
 import os
-import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, text
 from sqlalchemy.orm import Session
-from PIL import Image
-import io
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db, User
-from auth import UserResponse, get_current_user_required
+from database import get_db, get_read_db, get_async_read_db, has_user_search_index, User
+from auth import UserResponse, get_current_user_required, invalidate_user, user_cache
+from avatars import store_avatar
 
 router = APIRouter(prefix="/api/users", tags=["Users"])
 
-UPLOAD_DIR = "uploads"
-AVATAR_SIZE = (200, 200)
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+MULTIPART_OVERHEAD = 64 * 1024  # intestazioni multipart e campi oltre al file
 
+# Decodifica e ridimensionamento degli avatar: pool dedicato, fuori dall'event loop
+AVATAR_WORKERS = int(os.getenv("AVATAR_WORKERS", "2"))
+_avatar_executor: Optional[ThreadPoolExecutor] = None
 
-def resize_image(image_data: bytes, size: tuple = AVATAR_SIZE) -> bytes:
-    """Resize image to specified size, maintaining aspect ratio with crop"""
-    img = Image.open(io.BytesIO(image_data))
+# Lunghezza minima per la ricerca per sottostringa (un trigramma); sotto si cerca per prefisso
+USER_SEARCH_TRIGRAM_MIN = 3
+_user_search_index = None
 
-    # Convert to RGB if necessary (for PNG with transparency)
-    if img.mode in ("RGBA", "P"):
-        img = img.convert("RGB")
+# Massimo numero di id per GET /api/users?ids=
+USERS_LOOKUP_MAX = int(os.getenv("USERS_LOOKUP_MAX", "100"))
 
-    # Calculate dimensions to maintain aspect ratio with center crop
-    width, height = img.size
-    target_width, target_height = size
 
-    # Calculate ratios
-    ratio_w = target_width / width
-    ratio_h = target_height / height
+async def run_avatar_job(fn, *args):
+    """Esegue l'elaborazione dell'immagine sul pool degli avatar"""
+    global _avatar_executor
+    if _avatar_executor is None:
+        _avatar_executor = ThreadPoolExecutor(max_workers=AVATAR_WORKERS, thread_name_prefix="avatar")
+    return await asyncio.get_running_loop().run_in_executor(_avatar_executor, fn, *args)
 
-    # Use the larger ratio to ensure image fills the target size
-    ratio = max(ratio_w, ratio_h)
 
-    # Resize
-    new_width = int(width * ratio)
-    new_height = int(height * ratio)
-    img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-    # Center crop
-    left = (new_width - target_width) // 2
-    top = (new_height - target_height) // 2
-    right = left + target_width
-    bottom = top + target_height
-    img = img.crop((left, top, right, bottom))
-
-    # Save to bytes
-    output = io.BytesIO()
-    img.save(output, format="JPEG", quality=85)
-    output.seek(0)
+class AvatarUploadLimit:
+    """
+    Middleware ASGI: rifiuta gli upload dell'avatar oltre MAX_FILE_SIZE mentre
+    arrivano, senza leggerli tutti (Content-Length subito, altrimenti contando i byte)
+    """
 
-    return output.getvalue()
+    def __init__(self, app, path: str = "/api/users/avatar", max_body: int = MAX_FILE_SIZE + MULTIPART_OVERHEAD):
+        self.app = app
+        self.path = path
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body:
+            response = JSONResponse(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                content={"detail": "File troppo grande. Massimo 5MB"},
+                headers={"Connection": "close"}
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="File troppo grande. Massimo 5MB"
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def user_search_index(db: Session) -> bool:
+    """L'indice users_fts esiste? (controllato una volta per processo)"""
+    global _user_search_index
+    if _user_search_index is None:
+        _user_search_index = has_user_search_index(db.connection())
+    return _user_search_index
 
 
 @router.post("/avatar", response_model=UserResponse)
@@ -82,48 +117,31 @@ async def upload_avatar(
             detail=f"Formato file non supportato. Usa: {', '.join(ALLOWED_EXTENSIONS)}"
         )
 
-    # Read file content
-    content = await file.read()
-
-    # Validate file size
-    if len(content) > MAX_FILE_SIZE:
+    # Il corpo è già limitato da AvatarUploadLimit; il file è su SpooledTemporaryFile
+    if file.size is not None and file.size > MAX_FILE_SIZE:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="File troppo grande. Massimo 5MB"
         )
 
-    # Resize image
+    # Varianti dell'immagine (letta dal file in streaming, sul pool degli avatar)
     try:
-        resized_content = resize_image(content)
+        avatar_path = await run_avatar_job(store_avatar, file.file)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Errore nel processare l'immagine: {str(e)}"
         )
 
-    # Generate unique filename
-    filename = f"avatar_{current_user.id}_{uuid.uuid4().hex[:8]}.jpg"
-    filepath = os.path.join(UPLOAD_DIR, filename)
-
-    # Delete old avatar if exists
-    if current_user.avatar_path:
-        old_path = current_user.avatar_path.lstrip("/")
-        if os.path.exists(old_path):
-            try:
-                os.remove(old_path)
-            except:
-                pass  # Ignore errors on old file deletion
-
-    # Save new avatar
-    with open(filepath, "wb") as f:
-        f.write(resized_content)
-
-    # Update user in database
-    current_user.avatar_path = f"/uploads/{filename}"
+    # Update user in database (ricaricato in questa sessione)
+    # (i file del vecchio avatar li elimina avatar_sweeper, se nessuno lo usa più)
+    user = db.get(User, current_user.id)
+    user.avatar_path = avatar_path
     db.commit()
-    db.refresh(current_user)
+    db.refresh(user)
+    invalidate_user(user.id)
 
-    return UserResponse.model_validate(current_user)
+    return UserResponse.model_validate(user)
 
 
 @router.delete("/avatar", response_model=UserResponse)
@@ -133,16 +151,12 @@ async def delete_avatar(
 ):
     """Delete user avatar"""
     if current_user.avatar_path:
-        old_path = current_user.avatar_path.lstrip("/")
-        if os.path.exists(old_path):
-            try:
-                os.remove(old_path)
-            except:
-                pass
-
-        current_user.avatar_path = None
+        user = db.get(User, current_user.id)
+        user.avatar_path = None
         db.commit()
-        db.refresh(current_user)
+        db.refresh(user)
+        invalidate_user(user.id)
+        return UserResponse.model_validate(user)
 
     return UserResponse.model_validate(current_user)
 
@@ -151,13 +165,14 @@ async def delete_avatar(
 async def search_users(
     q: str,
     current_user: User = Depends(get_current_user_required),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Search users by username
 
     - **q**: Search query (min 2 chars)
-    - Returns max 20 users matching the query
+    - Returns max 20 users matching the query: usernames containing it,
+      or starting with it for queries shorter than 3 chars
     """
     if len(q) < 2:
         raise HTTPException(
@@ -165,10 +180,30 @@ async def search_users(
             detail="Query deve essere almeno 2 caratteri"
         )
 
-    users = db.query(User).filter(
-        User.username.ilike(f"%{q}%"),
-        User.id != current_user.id  # Exclude self
-    ).limit(20).all()
+    query = q.lower().strip()
+
+    if len(query) < USER_SEARCH_TRIGRAM_MIN:
+        # Query corte: prefisso, come intervallo sull'indice univoco di username
+        upper = query[:-1] + chr(ord(query[-1]) + 1) if query else "\U0010ffff"
+        users = db.execute(select(User.id, User.username, User.avatar_path).where(
+            User.username >= query,
+            User.username < upper,
+            User.id != current_user.id  # Exclude self
+        ).order_by(User.username).limit(20)).all()
+    elif user_search_index(db):
+        # Sottostringa tramite l'indice trigram (frase tra virgolette: nessuna sintassi FTS)
+        phrase = '"' + query.replace('"', '""') + '"'
+        users = db.execute(text("""
+            SELECT users.id, users.username, users.avatar_path
+            FROM users_fts JOIN users ON users.id = users_fts.rowid
+            WHERE users_fts MATCH :phrase AND users.id != :user_id
+            LIMIT 20
+        """), {"phrase": phrase, "user_id": current_user.id}).all()
+    else:
+        users = db.execute(select(User.id, User.username, User.avatar_path).where(
+            User.username.ilike(f"%{query}%"),
+            User.id != current_user.id  # Exclude self
+        ).limit(20)).all()
 
     return [
         {
@@ -180,11 +215,57 @@ async def search_users(
     ]
 
 
+@router.get("")
+async def get_users(
+    ids: str,
+    current_user: User = Depends(get_current_user_required),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Get several users at once
+
+    - **ids**: Comma-separated user ids (max USERS_LOOKUP_MAX)
+    - Returns id, username and avatar_path of the users that exist, in the requested order
+    """
+    try:
+        user_ids = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids deve essere una lista di id separati da virgola"
+        )
+
+    if len(user_ids) > USERS_LOOKUP_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Massimo {USERS_LOOKUP_MAX} utenti per richiesta"
+        )
+
+    # Prima la cache degli utenti (la stessa dell'autenticazione), poi una sola query per i mancanti
+    users = {user_id: user_cache.get(user_id) for user_id in user_ids}
+    missing = [user_id for user_id, user in users.items() if user is None]
+    if missing:
+        result = await db.execute(select(User).where(User.id.in_(missing)))
+        for user in result.scalars():
+            user_cache.set(user.id, user)
+            users[user.id] = user
+
+    return [
+        {
+            "id": user.id,
+            "username": user.username,
+            "avatar_path": user.avatar_path
+        }
+        for user in users.values()
+        if user is not None
+    ]
+
+
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: int,
     current_user: User = Depends(get_current_user_required),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get user by ID"""
     user = db.query(User).filter(User.id == user_id).first()
@@ -0,0 +1,85 @@
+"""
+Stateless Shot game tokens for Hot and Cold Game
+The game id itself carries the database entry index and the expiry,
+authenticated with HMAC-SHA256: checking a guess needs no server-side state
+"""
+
+import os
+import hmac
+import time
+import base64
+import struct
+import hashlib
+from typing import Optional
+
+from auth import SECRET_KEY
+
+# "1": il game_id è un token firmato (nessuno stato sul server, qualunque worker
+# può verificarlo); "0": game_id casuale salvato nello store delle partite
+SHOT_STATELESS_TOKENS = os.getenv("SHOT_STATELESS_TOKENS", "0") == "1"
+
+TOKEN_VERSION = 1
+PAYLOAD = struct.Struct(">BII4s")  # versione, indice entry, scadenza (unix), nonce
+MAC_SIZE = 12  # HMAC-SHA256 troncato a 96 bit
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class ShotTokenSigner:
+    """
+    Firma e verifica dei game_id Shot.
+    La chiave dipende anche dal contenuto del database Shot: se il database
+    cambia, i token già emessi (che contengono un indice) non sono più validi.
+    """
+
+    def __init__(self, database_digest: bytes, ttl_seconds: int, secret: str = SECRET_KEY):
+        self.ttl = ttl_seconds
+        self._key = hmac.new(secret.encode("utf-8"), b"shot:" + database_digest, hashlib.sha256).digest()
+        self.issued = 0
+        self.rejected = 0
+
+    def _mac(self, payload: bytes) -> bytes:
+        return hmac.new(self._key, payload, hashlib.sha256).digest()[:MAC_SIZE]
+
+    def issue(self, entry_index: int) -> str:
+        """Token per l'entry `entry_index` del database, valido per ttl secondi"""
+        payload = PAYLOAD.pack(TOKEN_VERSION, entry_index, int(time.time()) + self.ttl, os.urandom(4))
+        self.issued += 1
+        return _b64encode(payload + self._mac(payload))
+
+    def verify(self, token: str) -> Optional[int]:
+        """Indice dell'entry, o None se il token è falso, alterato o scaduto"""
+        try:
+            data = _b64decode(token)
+        except (ValueError, TypeError):
+            data = b""
+
+        if len(data) != PAYLOAD.size + MAC_SIZE:
+            self.rejected += 1
+            return None
+
+        payload, mac = data[:PAYLOAD.size], data[PAYLOAD.size:]
+        version, entry_index, expires_at, _ = PAYLOAD.unpack(payload)
+        if (
+            version != TOKEN_VERSION
+            or not hmac.compare_digest(mac, self._mac(payload))
+            or expires_at < time.time()
+        ):
+            self.rejected += 1
+            return None
+
+        return entry_index
+
+    def stats(self) -> dict:
+        return {"issued": self.issued, "rejected": self.rejected}
+
+
+def database_digest(raw: bytes) -> bytes:
+    """Impronta del file del database Shot (entra nella chiave dei token)"""
+    return hashlib.sha256(raw).digest()
@@ -0,0 +1,516 @@
+"""
+Pluggable state backends for Hot and Cold Game
+Live progress and Shot games can live in process memory (default), in a
+SQLite table shared by the workers of one machine, or in a Redis-compatible
+server shared by several machines
+"""
+
+import os
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from state_store import TTLStore, register_store
+
+logger = logging.getLogger(__name__)
+
+# "memory" (un processo), "sqlite" (worker della stessa macchina), "redis" (più macchine)
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_SQLITE_PATH = os.getenv("STATE_SQLITE_PATH", "state.db")
+STATE_REDIS_URL = os.getenv("STATE_REDIS_URL", "redis://localhost:6379/0")
+STATE_KEY_PREFIX = os.getenv("STATE_KEY_PREFIX", "hotncold:")
+
+# Campo degli hash con il contatore di versione e (Redis) suffisso del sorted set
+# con la versione di ogni campo
+VERSION_FIELD = "_v"
+VERSIONS_SUFFIX = ":versions"
+
+
+def initial_version() -> int:
+    """
+    Versione di un hash nuovo (o ricreato dopo la scadenza): l'ora corrente in ms,
+    come le classifiche in memoria. Poi avanza di uno a scrittura, quindi un hash
+    ricreato riparte sopra le versioni già viste dai client (e dai worker), a meno
+    di più di una scrittura al ms sostenuta per tutta la vita dell'hash
+    """
+    return int(time.time() * 1000)
+
+
+class StateBackend:
+    """
+    Interfaccia comune degli store di stato.
+    Chiavi semplici (get/set/delete) e hash con un contatore di versione
+    incrementato atomicamente a ogni scrittura (hash_put); ogni campo ricorda la
+    versione della sua ultima scrittura, così hash_since legge solo i campi
+    cambiati dopo una versione già vista.
+    Valori e campi sono stringhe.
+    """
+
+    name = "base"
+    shared = True  # stato visibile a tutti i processi/macchine
+
+    def __init__(self):
+        self.ops = 0
+        self.errors = 0
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def hash_put(self, key: str, field: str, value: str, ttl: float) -> int:
+        """Scrive un campo, rinnova la scadenza dell'hash e ritorna la nuova versione"""
+        raise NotImplementedError
+
+    def hash_since(self, key: str, since: int) -> Tuple[int, Dict[str, str]]:
+        """(versione, campi scritti dopo la versione `since`) dell'hash"""
+        raise NotImplementedError
+
+    def hash_snapshot(self, key: str) -> Tuple[int, Dict[str, str]]:
+        """(versione, tutti i campi) dell'hash"""
+        return self.hash_since(key, 0)
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "ops": self.ops, "errors": self.errors}
+
+
+class MemoryBackend(StateBackend):
+    """Stato nel processo corrente (comportamento di default, nessuna condivisione)"""
+
+    name = "memory"
+    shared = False
+
+    def __init__(self, maxsize: int = 100000):
+        super().__init__()
+        self._store = TTLStore("memory_backend", default_ttl=3600, maxsize=maxsize)
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        self.ops += 1
+        value = self._store.get(key)
+        return value if isinstance(value, str) else None
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self.ops += 1
+        self._store.set(key, value, ttl)
+
+    def delete(self, key: str) -> None:
+        self.ops += 1
+        self._store.pop(key)
+
+    def hash_put(self, key: str, field: str, value: str, ttl: float) -> int:
+        self.ops += 1
+        with self._lock:
+            current = self._store.get(key)
+            if isinstance(current, tuple):
+                version, fields = current[0] + 1, current[1]
+            else:
+                version, fields = initial_version(), {}
+            # Nuovo dict a ogni scrittura: gli snapshot già restituiti non cambiano
+            self._store.set(key, (version, {**fields, field: (version, value)}), ttl)
+            return version
+
+    def hash_since(self, key: str, since: int) -> Tuple[int, Dict[str, str]]:
+        self.ops += 1
+        current = self._store.get(key)
+        if not isinstance(current, tuple):
+            return 0, {}
+        version, fields = current
+        return version, {k: value for k, (v, value) in fields.items() if v > since}
+
+
+class SQLiteBackend(StateBackend):
+    """
+    Stato in una tabella SQLite (WAL) condivisa dai worker della stessa macchina.
+    Le scadenze usano l'ora di sistema; le righe scadute sono ignorate in
+    lettura e cancellate dallo sweeper dello stato.
+    """
+
+    name = "sqlite"
+
+    # Un hash è vivo finché lo è la sua riga di versione (field = '_v'): hash_put
+    # rinnova solo quella, i campi restano con la scadenza della loro scrittura
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS state_entries (
+            key TEXT NOT NULL,
+            field TEXT NOT NULL DEFAULT '',
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (key, field)
+        ) WITHOUT ROWID
+    """
+
+    UPSERT = """
+        INSERT INTO state_entries (key, field, value, expires_at, version) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (key, field) DO UPDATE SET
+            value = excluded.value, expires_at = excluded.expires_at, version = excluded.version
+    """
+
+    def __init__(self, path: str = STATE_SQLITE_PATH):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(self.SCHEMA)
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_state_entries_version ON state_entries (key, version)")
+        register_store(self)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Una connessione per thread e per processo (prefork forka dopo l'import)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        self.ops += 1
+        row = self._connection().execute(
+            "SELECT value FROM state_entries WHERE key = ? AND field = '' AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self.ops += 1
+        self._connection().execute(self.UPSERT, (key, "", value, time.time() + ttl, 0))
+
+    def delete(self, key: str) -> None:
+        self.ops += 1
+        self._connection().execute("DELETE FROM state_entries WHERE key = ?", (key,))
+
+    def hash_put(self, key: str, field: str, value: str, ttl: float) -> int:
+        self.ops += 1
+        now = time.time()
+        expires_at = now + ttl
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Hash scaduto: si riparte senza campi, dalla versione iniziale
+            conn.execute(
+                """
+                DELETE FROM state_entries WHERE key = ? AND EXISTS (
+                    SELECT 1 FROM state_entries WHERE key = ? AND field = ? AND expires_at <= ?
+                )
+                """,
+                (key, key, VERSION_FIELD, now)
+            )
+            conn.execute(
+                """
+                INSERT INTO state_entries (key, field, value, expires_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (key, field) DO UPDATE SET
+                    value = CAST(value AS INTEGER) + 1, expires_at = excluded.expires_at
+                """,
+                (key, VERSION_FIELD, str(initial_version()), expires_at)
+            )
+            version = int(conn.execute(
+                "SELECT value FROM state_entries WHERE key = ? AND field = ?", (key, VERSION_FIELD)
+            ).fetchone()[0])
+            conn.execute(self.UPSERT, (key, field, value, expires_at, version))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            self.errors += 1
+            raise
+        return version
+
+    def hash_since(self, key: str, since: int) -> Tuple[int, Dict[str, str]]:
+        self.ops += 1
+        conn = self._connection()
+        # Versione e campi dalla stessa transazione di lettura (snapshot WAL)
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute(
+                "SELECT value FROM state_entries WHERE key = ? AND field = ? AND expires_at > ?",
+                (key, VERSION_FIELD, time.time())
+            ).fetchone()
+            if row is None:
+                return 0, {}
+            rows = conn.execute(
+                "SELECT field, value FROM state_entries WHERE key = ? AND version > ? AND field != ?",
+                (key, since, VERSION_FIELD)
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        return int(row[0]), dict(rows)
+
+    def sweep(self) -> int:
+        """Cancella chiavi e hash scaduti (chiamato dallo sweeper dello stato)"""
+        now = time.time()
+        cursor = self._connection().execute(
+            """
+            DELETE FROM state_entries WHERE expires_at <= ? AND (
+                field = '' OR key NOT IN (
+                    SELECT key FROM state_entries WHERE field = ? AND expires_at > ?
+                )
+            )
+            """,
+            (now, VERSION_FIELD, now)
+        )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+            self._local.conn = None
+
+    def stats(self) -> dict:
+        rows = self._connection().execute("SELECT COUNT(*) FROM state_entries").fetchone()[0]
+        return {**super().stats(), "path": self.path, "rows": rows}
+
+
+class RESPError(Exception):
+    """Risposta di errore (-ERR ...) del server Redis"""
+
+
+def encode_command(*args: Any) -> bytes:
+    """Comando nel formato RESP (array di bulk string)"""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+def read_reply(stream) -> Any:
+    """Legge una risposta RESP; gli errori sono ritornati (non sollevati) come RESPError"""
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("Connessione chiusa dal server")
+
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode("utf-8")
+    if kind == b"-":
+        return RESPError(payload.decode("utf-8"))
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        return stream.read(length + 2)[:-2].decode("utf-8")
+    if kind == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [read_reply(stream) for _ in range(length)]
+    raise ConnectionError(f"Risposta RESP non valida: {line!r}")
+
+
+class RedisBackend(StateBackend):
+    """
+    Stato su un server Redis (o compatibile), condiviso da più macchine.
+    Client RESP minimale sulla libreria standard: una connessione per processo,
+    comandi in pipeline, una riconnessione automatica in caso di errore di rete.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = STATE_REDIS_URL, prefix: str = STATE_KEY_PREFIX, timeout: float = 2.0):
+        super().__init__()
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.password = parts.password
+        self.prefix = prefix
+        self.timeout = timeout
+        self.reconnects = 0
+        self.conflicts = 0  # transazioni hash_put ripetute per scritture concorrenti
+        self._sock: Optional[socket.socket] = None
+        self._stream = None
+        self._pid = None
+        self._lock = Lock()
+
+    def _connect(self) -> None:
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._stream = self._sock.makefile("rb")
+        self._pid = os.getpid()
+
+        handshake = []
+        if self.password:
+            handshake.append(("AUTH", self.password))
+        if self.db:
+            handshake.append(("SELECT", self.db))
+        if handshake:
+            self._send(handshake)
+
+    def _disconnect(self) -> None:
+        if self._sock is not None:
+            try:
+                self._stream.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._stream = None
+
+    def _send(self, commands: List[tuple]) -> list:
+        self._sock.sendall(b"".join(encode_command(*command) for command in commands))
+        replies = [read_reply(self._stream) for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RESPError):
+                raise reply
+        return replies
+
+    def _run(self, call: Callable[[], Any]) -> Any:
+        """Esegue call() sulla connessione del processo, con una riconnessione in caso di errore di rete"""
+        self.ops += 1
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None or self._pid != os.getpid():
+                        self._connect()
+                    return call()
+                except (OSError, ConnectionError) as e:
+                    self._disconnect()
+                    if attempt:
+                        self.errors += 1
+                        raise
+                    self.reconnects += 1
+                    logger.warning(f"⚠️ Connessione Redis persa, riprovo: {e}")
+                except RESPError:
+                    self.errors += 1
+                    raise
+
+    def pipeline(self, commands: List[tuple]) -> list:
+        """Invia più comandi in un solo round trip e ritorna le risposte"""
+        return self._run(lambda: self._send(commands))
+
+    def execute(self, *command) -> Any:
+        return self.pipeline([command])[0]
+
+    def get(self, key: str) -> Optional[str]:
+        return self.execute("GET", self.prefix + key)
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self.execute("SET", self.prefix + key, value, "PX", max(int(ttl * 1000), 1))
+
+    def delete(self, key: str) -> None:
+        self.execute("DEL", self.prefix + key)
+
+    def hash_put(self, key: str, field: str, value: str, ttl: float) -> int:
+        key = self.prefix + key
+        versions = key + VERSIONS_SUFFIX
+        ttl_ms = max(int(ttl * 1000), 1)
+
+        def transaction() -> int:
+            # La versione di ogni campo va nel sorted set insieme al valore: la si legge
+            # sotto WATCH e se un altro client scrive l'hash prima di EXEC si riprova
+            while True:
+                current = self._send([("WATCH", key), ("HGET", key, VERSION_FIELD)])[1]
+                version = initial_version() if current is None else int(current) + 1
+                replies = self._send([
+                    ("MULTI",),
+                    *([("DEL", versions)] if current is None else []),
+                    ("HSET", key, VERSION_FIELD, version, field, value),
+                    ("ZADD", versions, version, field),
+                    ("PEXPIRE", key, ttl_ms),
+                    ("PEXPIRE", versions, ttl_ms),
+                    ("EXEC",),
+                ])
+                if replies[-1] is not None:
+                    return version
+                self.conflicts += 1
+
+        return self._run(transaction)
+
+    def hash_since(self, key: str, since: int) -> Tuple[int, Dict[str, str]]:
+        key = self.prefix + key
+        version, fields = self.pipeline([
+            ("MULTI",),
+            ("HGET", key, VERSION_FIELD),
+            ("ZRANGEBYSCORE", key + VERSIONS_SUFFIX, f"({since}", "+inf"),
+            ("EXEC",),
+        ])[-1]
+        if version is None:
+            return 0, {}
+        if not fields:
+            return int(version), {}
+        # Un valore può essere già più recente della versione letta: al prossimo
+        # allineamento viene riletto uguale e ignorato
+        values = self.execute("HMGET", key, *fields)
+        return int(version), {f: v for f, v in zip(fields, values) if v is not None}
+
+    def close(self) -> None:
+        with self._lock:
+            self._disconnect()
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "server": f"{self.host}:{self.port}/{self.db}",
+            "reconnects": self.reconnects,
+            "conflicts": self.conflicts,
+        }
+
+
+class BackendStore:
+    """
+    Stessa interfaccia di TTLStore (get/set/pop) per valori stringa salvati
+    in uno StateBackend condiviso, con le chiavi prefissate dal nome dello store
+    """
+
+    def __init__(self, backend: StateBackend, name: str, default_ttl: float):
+        self.backend = backend
+        self.name = name
+        self.default_ttl = default_ttl
+
+    def get(self, key: str) -> Optional[str]:
+        return self.backend.get(f"{self.name}:{key}")
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self.backend.set(f"{self.name}:{key}", value, self.default_ttl if ttl is None else ttl)
+
+    def pop(self, key: str) -> Optional[str]:
+        value = self.get(key)
+        if value is not None:
+            self.backend.delete(f"{self.name}:{key}")
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+
+def create_state_backend(backend: str = STATE_BACKEND) -> StateBackend:
+    """Crea il backend configurato con STATE_BACKEND"""
+    if backend == "sqlite":
+        return SQLiteBackend()
+    if backend == "redis":
+        return RedisBackend()
+    if backend == "memory":
+        return MemoryBackend()
+    raise ValueError(f"STATE_BACKEND non valido: {backend}")
+
+
+def create_state_store(name: str, default_ttl: float, maxsize: int, **kwargs):
+    """
+    Store per valori stringa con scadenza: in memoria (TTLStore) o sul
+    backend condiviso configurato
+    """
+    if state_backend.shared:
+        return BackendStore(state_backend, name, default_ttl)
+    return TTLStore(name, default_ttl=default_ttl, maxsize=maxsize, **kwargs)
+
+
+# Istanza globale usata per lo stato condiviso tra worker
+state_backend = create_state_backend()
@@ -0,0 +1,190 @@
+"""
+Expiring in-memory state for Hot and Cold Game
+Per-key TTL, size limit and a background sweeper, so that day-scoped state
+(leaderboards, Shot games) does not grow with uptime
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Intervallo tra due passate del sweeper sulle chiavi scadute
+STATE_SWEEP_INTERVAL_SECONDS = int(os.getenv("STATE_SWEEP_INTERVAL_SECONDS", "60"))
+
+
+def default_sizeof(key: Hashable, value: Any) -> int:
+    return sys.getsizeof(key) + sys.getsizeof(value)
+
+
+class TTLStore:
+    """
+    Thread-safe key/value store with per-key expiry.
+    Entries are kept in least-recently-used order (get, set and touch count as
+    a use): when the store is full the least recently used one is evicted. Expired entries are never returned and are
+    removed by sweep() (or lazily on access).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        default_ttl: float,
+        maxsize: int,
+        sizeof: Callable[[Hashable, Any], int] = default_sizeof
+    ):
+        self.name = name
+        self.default_ttl = default_ttl
+        self.maxsize = maxsize
+        self.sizeof = sizeof
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()  # key -> (value, scadenza)
+        self._lock = Lock()
+
+        # Metriche
+        self.expired = 0
+        self.evicted = 0
+
+        register_store(self)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the value (or None if missing/expired)"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expired += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value for `ttl` seconds, evicting the least recently used entries if full"""
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evicted += 1
+
+    def touch(self, key: Hashable, ttl: Optional[float] = None) -> bool:
+        """Push the expiry of an existing entry to at least now + ttl"""
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False
+            if expires_at > item[1]:
+                self._data[key] = (item[0], expires_at)
+            self._data.move_to_end(key)
+            return True
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.pop(key, None)
+            return item[0] if item is not None else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        """Snapshot of the live entries"""
+        now = time.monotonic()
+        with self._lock:
+            return iter([(k, v) for k, (v, expires_at) in self._data.items() if expires_at > now])
+
+    def sweep(self) -> int:
+        """Remove every expired entry, returns how many were removed"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (_, expires_at) in self._data.items() if expires_at <= now]
+            for key in expired:
+                del self._data[key]
+        self.expired += len(expired)
+        return len(expired)
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the entries"""
+        with self._lock:
+            entries = list(self._data.items())
+        return sum(self.sizeof(key, value) for key, (value, _) in entries)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "memory_kb": round(self.memory_bytes() / 1024, 1),
+        }
+
+
+# Tutti gli store creati, puliti dallo stesso sweeper
+# (TTLStore o qualunque oggetto con name, sweep() e stats(), es. il backend SQLite)
+_stores: Dict[str, Any] = {}
+
+
+def register_store(store) -> None:
+    _stores[store.name] = store
+
+
+def sweep_all() -> int:
+    return sum(store.sweep() for store in list(_stores.values()))
+
+
+def state_stats() -> dict:
+    """Metriche di tutti gli store, per /metrics"""
+    return {name: store.stats() for name, store in _stores.items()}
+
+
+class StateSweeper:
+    """Task di background che rimuove periodicamente le chiavi scadute"""
+
+    def __init__(self, interval_seconds: int = STATE_SWEEP_INTERVAL_SECONDS):
+        self.interval = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                # Il backend SQLite pulisce con una DELETE: fuori dall'event loop
+                removed = await asyncio.to_thread(sweep_all)
+                self.runs += 1
+                if removed:
+                    logger.info(f"🧹 Stato in memoria: rimosse {removed} chiavi scadute")
+            except Exception as e:
+                logger.error(f"❌ Errore pulizia stato: {e}")
+
+    def start(self) -> None:
+        """Avvia la pulizia periodica (da chiamare nello startup dell'app)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+state_sweeper = StateSweeper()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test del numero di query SQL delle route amici
+Il numero di query non deve crescere con il numero di amici (niente N+1).
+Gira in-process su un database temporaneo: non serve il server avviato.
+
+Uso:
+  python test_query_count.py
+"""
+
+import os
+import sys
+import tempfile
+
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="querycount_"), "hotncold.db")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import database
+from database import SessionLocal, User, Friendship, FriendshipStatus, GameSession
+from auth import create_access_token, get_password_hash
+from routers import friends_router, game_router
+
+GAME_DATE = "2025-12-01"
+
+
+def print_section(title):
+    """Stampa intestazione sezione"""
+    print("\n" + "="*60)
+    print(f"  {title}")
+    print("="*60 + "\n")
+
+
+class QueryCounter:
+    """Conta le query eseguite su tutti gli engine (sync, read, async)"""
+
+    def __init__(self):
+        self.count = 0
+        engines = [
+            database.engine,
+            database.read_engine,
+            database.async_engine.sync_engine,
+            database.async_read_engine.sync_engine,
+        ]
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def measure(self, call):
+        start = self.count
+        response = call()
+        assert response.status_code == 200, response.text
+        return self.count - start, response.json()
+
+
+def create_user_with_friends(db, name, friends):
+    """Utente con `friends` amici accettati (metà in ciascuna direzione), 2 richieste e sessioni del giorno"""
+    password = get_password_hash("password123")
+    user = User(username=name, password_hash=password)
+    db.add(user)
+    db.flush()
+
+    for i in range(friends + 2):
+        other = User(username=f"{name}_friend{i}", password_hash=password)
+        db.add(other)
+        db.flush()
+        status = FriendshipStatus.ACCEPTED if i < friends else FriendshipStatus.PENDING
+        if i % 2:
+            db.add(Friendship(user_id=user.id, friend_id=other.id, status=status))
+        else:
+            db.add(Friendship(user_id=other.id, friend_id=user.id, status=status))
+        if i % 3 == 0:
+            db.add(GameSession(user_id=other.id, game_date=GAME_DATE, game_mode="daily",
+                               attempts=i + 1, completed=True, won=True))
+
+    db.commit()
+    return create_access_token(data={"sub": str(user.id)})
+
+
+if __name__ == "__main__":
+    print("\n" + "🧪"*30)
+    print("  TEST NUMERO DI QUERY")
+    print("🧪"*30)
+
+    database.init_db()
+
+    app = FastAPI()
+    app.include_router(friends_router.router)
+    app.include_router(game_router.router)
+
+    with SessionLocal() as db:
+        tokens = {size: create_user_with_friends(db, f"user{size}", size) for size in (2, 40)}
+
+    counter = QueryCounter()
+    client = TestClient(app)
+    ok = True
+
+    endpoints = {
+        "GET /api/friends": ("/api/friends", lambda data: len(data["friends"])),
+        "GET /api/game/friends/status": (f"/api/game/friends/status/{GAME_DATE}", len),
+    }
+
+    for label, (path, friends_in) in endpoints.items():
+        print_section(f"🔎 {label}")
+        counts = {}
+        for size, token in tokens.items():
+            headers = {"Authorization": f"Bearer {token}"}
+            counts[size], data = counter.measure(lambda: client.get(path, headers=headers))
+            print(f"   {size} amici -> {counts[size]} query ({friends_in(data)} amici nella risposta)")
+            ok = ok and friends_in(data) == size
+
+        constant = counts[2] == counts[40]
+        print(f"{'✅' if constant else '❌'} numero di query indipendente dal numero di amici")
+        ok = ok and constant
+
+    print_section("📋 Riepilogo")
+    print("✅ Nessuna query N+1" if ok else "❌ Il numero di query cresce con gli amici")
+    sys.exit(0 if ok else 1)
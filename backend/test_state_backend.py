@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test dei backend di stato (memory, sqlite, redis)
+Il backend redis viene provato contro resp_server.py avviato qui in un thread,
+oppure contro un server vero passando STATE_REDIS_URL.
+
+Uso:
+  python test_state_backend.py
+  STATE_REDIS_URL=redis://localhost:6379/15 python test_state_backend.py
+"""
+
+import os
+import time
+import socket
+import asyncio
+import tempfile
+import threading
+
+from state_backend import MemoryBackend, SQLiteBackend, RedisBackend
+import resp_server
+
+
+def print_section(title):
+    """Stampa intestazione sezione"""
+    print("\n" + "="*60)
+    print(f"  {title}")
+    print("="*60 + "\n")
+
+
+def start_resp_server() -> str:
+    """Avvia lo stand-in RESP su una porta libera e ritorna l'URL"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    ready = threading.Event()
+
+    async def run():
+        server = await resp_server.serve(port=port)
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=lambda: asyncio.run(run()), daemon=True).start()
+    ready.wait(5)
+    return f"redis://127.0.0.1:{port}/0"
+
+
+def check_backend(name, make_backend):
+    """Stesse verifiche per ogni backend; make_backend() simula un altro worker"""
+    print_section(f"🗄️  Backend {name}")
+    worker_a, worker_b = make_backend(), make_backend()
+    ok = True
+
+    def check(label, condition):
+        nonlocal ok
+        print(f"{'✅' if condition else '❌'} {label}")
+        ok = ok and condition
+
+    # Chiavi semplici con scadenza
+    worker_a.set("shot_games:abc", "gatto", ttl=0.3)
+    check("set/get visibile dall'altro worker", worker_b.get("shot_games:abc") == "gatto")
+    time.sleep(0.4)
+    check("chiave scaduta", worker_b.get("shot_games:abc") is None)
+    worker_a.set("shot_games:def", "cane", ttl=60)
+    worker_b.delete("shot_games:def")
+    check("delete", worker_a.get("shot_games:def") is None)
+
+    # Hash versionati (classifiche)
+    key = f"board:test_{name}_{time.time()}"
+    v1 = worker_a.hash_put(key, "1", '{"best_rank": 50}', ttl=60)
+    v2 = worker_b.hash_put(key, "2", '{"best_rank": 20}', ttl=60)
+    version, fields = worker_a.hash_snapshot(key)
+    check(f"versioni consecutive ({v1}, {v2})", v2 == v1 + 1)
+    check("snapshot coerente", version == v2 and fields == {"1": '{"best_rank": 50}', "2": '{"best_rank": 20}'})
+
+    # Scritture concorrenti: nessuna versione persa
+    threads = [
+        threading.Thread(target=lambda i=i: [
+            (worker_a if i % 2 else worker_b).hash_put(key, f"u{i}", str(n), ttl=60) for n in range(50)
+        ])
+        for i in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    version, fields = worker_b.hash_snapshot(key)
+    check(f"200 scritture concorrenti -> versione {version}", version == v1 + 201 and fields["u3"] == "49")
+
+    # Letture incrementali: solo i campi scritti dopo la versione già vista
+    seen = version
+    v3 = worker_a.hash_put(key, "1", '{"best_rank": 10}', ttl=60)
+    version, fields = worker_b.hash_since(key, seen)
+    check("hash_since: solo il campo cambiato", version == v3 and fields == {"1": '{"best_rank": 10}'})
+    check("hash_since: niente di nuovo", worker_b.hash_since(key, version) == (version, {}))
+
+    check("hash assente", worker_a.hash_snapshot("board:missing") == (0, {}))
+
+    # Hash scaduto: i vecchi campi non tornano
+    short = f"board:short_{name}_{time.time()}"
+    for n in range(20):
+        old_version = worker_a.hash_put(short, "old", str(n), ttl=0.3)
+    time.sleep(0.4)
+    check("hash scaduto", worker_b.hash_snapshot(short) == (0, {}))
+    new_version = worker_b.hash_put(short, "new", "y", ttl=60)
+    check("hash ricreato senza i campi scaduti", worker_a.hash_snapshot(short)[1] == {"new": "y"})
+    check(f"versione dopo la scadenza ({old_version} -> {new_version}) non torna indietro",
+          new_version > old_version and worker_a.hash_since(short, old_version)[1] == {"new": "y"})
+    print(f"\n📊 {worker_a.stats()}")
+
+    worker_a.close()
+    worker_b.close()
+    return ok
+
+
+if __name__ == "__main__":
+    print("\n" + "🧪"*30)
+    print("  TEST BACKEND DI STATO")
+    print("🧪"*30)
+
+    shared_memory = MemoryBackend()
+    sqlite_path = os.path.join(tempfile.mkdtemp(prefix="state_"), "state.db")
+    redis_url = os.getenv("STATE_REDIS_URL") or start_resp_server()
+
+    results = {
+        "memory": check_backend("memory", lambda: shared_memory),
+        "sqlite": check_backend("sqlite", lambda: SQLiteBackend(sqlite_path)),
+        "redis": check_backend("redis", lambda: RedisBackend(redis_url)),
+    }
+
+    print_section("📋 Riepilogo")
+    for name, passed in results.items():
+        print(f"{'✅' if passed else '❌'} {name}")
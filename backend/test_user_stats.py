@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test degli aggregati user_stats (contatori e streak)
+Non usa il database: applica le partite a righe UserStats in memoria.
+
+Uso:
+  python test_user_stats.py
+"""
+
+import sys
+from datetime import date
+
+from user_stats import ALL_MODES, apply_completed_game, displayed_streak, new_user_stats
+
+
+def print_section(title):
+    """Stampa intestazione sezione"""
+    print("\n" + "="*60)
+    print(f"  {title}")
+    print("="*60 + "\n")
+
+
+def play(games):
+    """Applica (data, vinta) nell'ordine dato alla riga "all" e ritorna la riga"""
+    stats = new_user_stats(1, ALL_MODES)
+    for game_date, won in games:
+        apply_completed_game(stats, game_date, won, attempts=5)
+    return stats
+
+
+CASES = [
+    # (descrizione, partite in ordine di arrivo, streak attesa, best attesa)
+    ("vittorie consecutive", [("2025-12-01", True), ("2025-12-02", True), ("2025-12-03", True)], 3, 3),
+    ("persa e poi vinta nello stesso giorno",
+     [("2025-12-01", True), ("2025-12-02", False), ("2025-12-02", True)], 2, 2),
+    ("vinta e poi persa nello stesso giorno",
+     [("2025-12-01", True), ("2025-12-02", True), ("2025-12-02", False)], 2, 2),
+    ("giorno senza vittorie interrompe la serie",
+     [("2025-12-01", True), ("2025-12-02", False), ("2025-12-03", True)], 1, 1),
+    ("giorno saltato interrompe la serie", [("2025-12-01", True), ("2025-12-03", True)], 1, 1),
+    ("due vittorie nello stesso giorno contano una volta", [("2025-12-01", True), ("2025-12-01", True)], 1, 1),
+    ("archivio più vecchio non tocca la streak",
+     [("2025-12-02", True), ("2025-12-03", True), ("2025-11-20", True)], 2, 2),
+]
+
+
+if __name__ == "__main__":
+    print("\n" + "🧪"*30)
+    print("  TEST USER_STATS")
+    print("🧪"*30)
+
+    ok = True
+
+    print_section("🔥 Streak")
+    for label, games, streak, best in CASES:
+        stats = play(games)
+        passed = (stats.current_streak, stats.best_streak) == (streak, best)
+        print(f"{'✅' if passed else '❌'} {label}: streak {stats.current_streak}, best {stats.best_streak}")
+        ok = ok and passed
+
+    print_section("📅 Streak mostrata")
+    stats = play([("2025-12-01", True), ("2025-12-02", True)])
+    checks = {
+        "oggi dopo una vittoria oggi": (date(2025, 12, 2), 2),
+        "il giorno dopo (si può ancora vincere)": (date(2025, 12, 3), 2),
+        "due giorni dopo": (date(2025, 12, 4), 0),
+    }
+    for label, (today, expected) in checks.items():
+        shown = displayed_streak(stats, today)
+        print(f"{'✅' if shown == expected else '❌'} {label}: {shown}")
+        ok = ok and shown == expected
+
+    print_section("📋 Riepilogo")
+    print("✅ Aggregati corretti" if ok else "❌ Aggregati errati")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,165 @@
+"""
+User statistics aggregates for Hot and Cold Game
+Per-user and per-mode counters and streaks, updated in the same transaction
+that starts or completes a game session, so GET /api/game/stats is a single lookup
+"""
+
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import GameSession, UserStats
+
+logger = logging.getLogger(__name__)
+
+# Riga con il totale di tutte le modalità
+ALL_MODES = "all"
+
+
+def new_user_stats(user_id: int, game_mode: str) -> UserStats:
+    return UserStats(
+        user_id=user_id,
+        game_mode=game_mode,
+        games_played=0,
+        games_won=0,
+        won_attempts=0,
+        total_hints=0,
+        current_streak=0,
+        best_streak=0,
+        last_played_date=None,
+        last_won_date=None,
+    )
+
+
+def apply_started_game(stats: UserStats, hints_used: int = 0) -> None:
+    """Conta una partita iniziata con i suoi hint (le partite giocate includono quelle in corso)"""
+    stats.games_played += 1
+    stats.total_hints += hints_used or 0
+    stats.updated_at = datetime.now(timezone.utc)
+
+
+def apply_completed_game(stats: UserStats, game_date: str, won: bool, attempts: int) -> None:
+    """
+    Aggiorna vittorie e streak con una partita appena conclusa.
+    La streak conta i giorni consecutivi con almeno una vittoria: una vittoria
+    estende la serie che finisce il giorno prima, qualunque partita (anche persa)
+    sia già stata registrata nello stesso giorno. Le vittorie d'archivio più
+    vecchie dell'ultimo giorno vinto contano nei totali ma non la toccano.
+    """
+    if won:
+        stats.games_won += 1
+        stats.won_attempts += attempts or 0
+
+    if stats.last_played_date is None or game_date > stats.last_played_date:
+        stats.last_played_date = game_date
+
+    last_won = stats.last_won_date
+    if won and (last_won is None or game_date > last_won):
+        previous_day = (date.fromisoformat(game_date) - timedelta(days=1)).isoformat()
+        stats.current_streak = stats.current_streak + 1 if last_won == previous_day else 1
+        stats.last_won_date = game_date
+
+    stats.best_streak = max(stats.best_streak, stats.current_streak)
+    stats.updated_at = datetime.now(timezone.utc)
+
+
+def displayed_streak(stats: UserStats, today: date) -> int:
+    """Streak attuale: azzerata se l'ultimo giorno vinto è prima di ieri"""
+    if not stats.last_won_date:
+        return 0
+    if date.fromisoformat(stats.last_won_date) < today - timedelta(days=1):
+        return 0
+    return stats.current_streak
+
+
+async def _user_stats_rows(db: AsyncSession, row: dict) -> List[UserStats]:
+    """Righe user_stats (modalità della sessione e "all") da aggiornare, create se mancano"""
+    result = []
+    for game_mode in (row["game_mode"], ALL_MODES):
+        stats = await db.get(UserStats, (row["user_id"], game_mode))
+        if stats is None:
+            stats = new_user_stats(row["user_id"], game_mode)
+            db.add(stats)
+            # db.get non vede le righe pending: le rende visibili alle righe successive del blocco
+            await db.flush()
+        result.append(stats)
+    return result
+
+
+async def record_started_games(db: AsyncSession, rows: Iterable[dict]) -> None:
+    """
+    Applica agli aggregati le sessioni appena create
+    (nella stessa transazione che le scrive)
+    """
+    for row in rows:
+        for stats in await _user_stats_rows(db, row):
+            apply_started_game(stats)
+
+
+async def record_completed_games(db: AsyncSession, rows: Iterable[dict]) -> None:
+    """
+    Applica agli aggregati le sessioni appena concluse
+    (nella stessa transazione che le scrive)
+    """
+    for row in rows:
+        for stats in await _user_stats_rows(db, row):
+            apply_completed_game(stats, row["game_date"], row["won"], row["attempts"])
+
+
+async def newly_started(db: AsyncSession, rows: List[dict]) -> List[dict]:
+    """Righe di sessioni non ancora presenti nel DB (una sola query per il blocco)"""
+    keys = [(row["user_id"], row["game_date"], row["game_mode"]) for row in rows]
+    result = await db.execute(
+        select(GameSession.user_id, GameSession.game_date, GameSession.game_mode)
+        .where(tuple_(GameSession.user_id, GameSession.game_date, GameSession.game_mode).in_(keys))
+    )
+    existing = {tuple(key) for key in result.all()}
+    return [row for row, key in zip(rows, keys) if key not in existing]
+
+
+async def newly_completed(db: AsyncSession, rows: List[dict]) -> List[dict]:
+    """Righe che concludono una sessione non ancora conclusa nel DB"""
+    result = []
+    for row in rows:
+        if not (row["completed"] or row["won"]):
+            continue
+        existing = (await db.execute(select(GameSession.completed, GameSession.won).where(
+            GameSession.user_id == row["user_id"],
+            GameSession.game_date == row["game_date"],
+            GameSession.game_mode == row["game_mode"]
+        ))).first()
+        if existing is not None and (existing.completed or existing.won):
+            continue
+        result.append(row)
+    return result
+
+
+def rebuild_user_stats(db: Session, user_id: Optional[int] = None) -> int:
+    """
+    Ricalcola gli aggregati dalle sessioni (tutti gli utenti o uno solo): tutte
+    contano come giocate (con i loro hint), quelle concluse anche per vittorie e streak.
+    Ritorna il numero di righe scritte; il commit è a carico del chiamante.
+    """
+    query = select(GameSession).order_by(GameSession.user_id, GameSession.game_date, GameSession.id)
+    if user_id is not None:
+        query = query.where(GameSession.user_id == user_id)
+        db.execute(delete(UserStats).where(UserStats.user_id == user_id))
+    else:
+        db.execute(delete(UserStats))
+
+    aggregates: Dict[Tuple[int, str], UserStats] = {}
+    for session in db.execute(query).scalars():
+        for game_mode in (session.game_mode or "daily", ALL_MODES):
+            key = (session.user_id, game_mode)
+            if key not in aggregates:
+                aggregates[key] = new_user_stats(*key)
+            apply_started_game(aggregates[key], session.hints_used)
+            if session.completed or session.won:
+                apply_completed_game(aggregates[key], session.game_date, bool(session.won), session.attempts or 0)
+
+    db.add_all(aggregates.values())
+    return len(aggregates)
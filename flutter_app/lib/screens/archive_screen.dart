@@ -16,15 +16,25 @@ class ArchiveScreen extends StatefulWidget {
 }
 
 class _ArchiveScreenState extends State<ArchiveScreen> {
-  List<Map<String, dynamic>> _archiveItems = [];
+  // Days loaded per history request (more are loaded while scrolling)
+  static const int _pageDays = 60;
+
+  final List<Map<String, dynamic>> _archiveItems = [];
   bool _isLoading = true;
+  bool _isLoadingMore = false;
+
+  // Start date of the game (as defined in backend). Dates are UTC midnights,
+  // so day arithmetic is not affected by daylight saving time
+  final DateTime _startDate = DateTime.utc(2025, 11, 1);
 
-  // Start date of the game (as defined in backend)
-  final DateTime _startDate = DateTime(2025, 11, 1);
+  // Oldest date already in the list
+  DateTime? _oldestLoaded;
 
   int? _userId;
   String? _token;
 
+  bool get _hasMore => _oldestLoaded != null && _oldestLoaded!.isAfter(_startDate);
+
   @override
   void initState() {
     super.initState();
@@ -39,6 +49,51 @@ class _ArchiveScreenState extends State<ArchiveScreen> {
 
   Future<void> _loadArchive() async {
     final now = DateTime.now();
+    final items = await _loadWindow(DateTime.utc(now.year, now.month, now.day));
+    if (!mounted) return;
+    setState(() {
+      _archiveItems
+        ..clear()
+        ..addAll(items);
+      _isLoading = false;
+    });
+  }
+
+  Future<void> _loadMore() async {
+    if (_isLoadingMore || !_hasMore) return;
+    _isLoadingMore = true;
+    final items = await _loadWindow(_oldestLoaded!.subtract(const Duration(days: 1)));
+    if (!mounted) return;
+    setState(() {
+      _archiveItems.addAll(items);
+      _isLoadingMore = false;
+    });
+  }
+
+  /// Archive items from [until] back to [_pageDays] days before (at most to
+  /// the start date), with the server history of just those dates
+  Future<List<Map<String, dynamic>>> _loadWindow(DateTime until) async {
+    var since = until.subtract(const Duration(days: _pageDays - 1));
+    if (since.isBefore(_startDate)) since = _startDate;
+
+    final items = await _buildItems(since, until);
+    _oldestLoaded = since;
+    return items;
+  }
+
+  /// Reload a single date (after playing it)
+  Future<void> _refreshDate(String dateStr) async {
+    final date = DateTime.parse('${dateStr}T00:00:00Z');
+    final items = await _buildItems(date, date);
+    if (!mounted || items.isEmpty) return;
+    final index = _archiveItems.indexWhere((item) => item['date'] == dateStr);
+    if (index < 0) return;
+    setState(() {
+      _archiveItems[index] = items.first;
+    });
+  }
+
+  Future<List<Map<String, dynamic>>> _buildItems(DateTime since, DateTime until) async {
     final List<Map<String, dynamic>> items = [];
 
     // Map to store server history data (date -> session info)
@@ -47,7 +102,12 @@ class _ArchiveScreenState extends State<ArchiveScreen> {
     // Try to load from server if authenticated
     if (_token != null) {
       try {
-        final history = await ApiService().getGameHistory(_token!);
+        final history = await ApiService().getGameHistory(
+          _token!,
+          gameMode: 'daily',
+          sinceDate: since,
+          untilDate: until,
+        );
         if (history != null) {
           for (final session in history) {
             final date = session['game_date'] as String;
@@ -71,10 +131,9 @@ class _ArchiveScreenState extends State<ArchiveScreen> {
     final prefs = await SharedPreferences.getInstance();
     final userKey = _userId != null ? 'user_${_userId}_' : 'guest_';
 
-    // Iterate from today back to start date
-    DateTime current = now;
-    while (current.isAfter(_startDate) ||
-        DateUtils.isSameDay(current, _startDate)) {
+    // Iterate from the end of the window back to its start
+    DateTime current = until;
+    while (current.isAfter(since) || DateUtils.isSameDay(current, since)) {
       final dateStr = DateFormat('yyyy-MM-dd').format(current);
 
       bool played = false;
@@ -114,10 +173,7 @@ class _ArchiveScreenState extends State<ArchiveScreen> {
       current = current.subtract(const Duration(days: 1));
     }
 
-    setState(() {
-      _archiveItems = items;
-      _isLoading = false;
-    });
+    return items;
   }
 
   @override
@@ -138,8 +194,18 @@ class _ArchiveScreenState extends State<ArchiveScreen> {
           ? Center(child: CircularProgressIndicator(color: PopTheme.black))
           : ListView.builder(
               padding: const EdgeInsets.all(16),
-              itemCount: _archiveItems.length,
+              itemCount: _archiveItems.length + (_hasMore ? 1 : 0),
               itemBuilder: (context, index) {
+                if (index >= _archiveItems.length) {
+                  // End of the loaded dates: load the previous window
+                  WidgetsBinding.instance.addPostFrameCallback((_) => _loadMore());
+                  return Padding(
+                    padding: const EdgeInsets.all(16),
+                    child: Center(
+                      child: CircularProgressIndicator(color: PopTheme.black),
+                    ),
+                  );
+                }
                 final item = _archiveItems[index];
                 return _buildArchiveCard(context, item);
               },
@@ -158,7 +224,7 @@ class _ArchiveScreenState extends State<ArchiveScreen> {
           MaterialPageRoute(
             builder: (context) => GameScreen(date: item['date']),
           ),
-        ).then((_) => _loadArchive()); // Reload when coming back
+        ).then((_) => _refreshDate(item['date'])); // Reload when coming back
       },
       child: Container(
         margin: const EdgeInsets.only(bottom: 12),
@@ -1,5 +1,6 @@
 import 'dart:convert';
 import 'package:http/http.dart' as http;
+import 'package:intl/intl.dart';
 import '../models/game_models.dart';
 import '../models/shot_models.dart';
 
@@ -17,6 +18,15 @@ class ApiService {
   // Per testing su rete locale, usa l'IP del tuo PC:
   // static const String baseUrl = 'http://192.168.1.XXX:8000';
 
+  /// URL di un avatar; per gli avatar con hash nel nome usa la variante WebP del lato
+  /// richiesto (48, 96 o 200 px), altrimenti il file originale
+  static String avatarUrl(String avatarPath, {int size = 200}) {
+    if (avatarPath.startsWith('/uploads/avatars/') && avatarPath.endsWith('_200.jpg')) {
+      return '$baseUrl${avatarPath.substring(0, avatarPath.length - '_200.jpg'.length)}_$size.webp';
+    }
+    return '$baseUrl$avatarPath';
+  }
+
   /// Test connessione al server
   Future<bool> testConnection() async {
     try {
@@ -245,6 +255,60 @@ class ApiService {
     }
   }
 
+  /// Get only the players changed after [since] (delta polling).
+  /// Returns {version, full, players, removed}; without [since], or when the
+  /// server cannot serve a delta, "full" is true and "players" is the whole list.
+  Future<Map<String, dynamic>?> getActivePlayersDelta(
+    String gameDate, {
+    int? since,
+    String gameMode = 'daily',
+    bool friendsOnly = false,
+    String? token,
+  }) async {
+    try {
+      final sinceParam = since != null ? '&since=$since' : '';
+      final uri = Uri.parse(
+        '$baseUrl/api/game/players/$gameDate?game_mode=$gameMode&friends_only=$friendsOnly$sinceParam',
+      );
+
+      final headers = <String, String>{
+        'Content-Type': 'application/json',
+      };
+      if (token != null) {
+        headers['Authorization'] = 'Bearer $token';
+      }
+
+      final response = await http.get(uri, headers: headers);
+
+      // Nessun cambiamento dalla versione richiesta
+      if (response.statusCode == 304) {
+        return {
+          'version': since,
+          'full': false,
+          'players': <dynamic>[],
+          'removed': <dynamic>[],
+        };
+      }
+
+      if (response.statusCode == 200) {
+        final data = json.decode(utf8.decode(response.bodyBytes));
+        if (data is List) {
+          return {
+            'version': int.tryParse(response.headers['x-board-version'] ?? ''),
+            'full': true,
+            'players': data,
+            'removed': <dynamic>[],
+          };
+        }
+        return data as Map<String, dynamic>;
+      }
+      return null;
+    } catch (e) {
+      print('❌ Errore getActivePlayersDelta: $e');
+      return null;
+    }
+  }
+
   /// Get user game statistics
   Future<Map<String, dynamic>?> getGameStats(String token) async {
     try {
@@ -265,11 +329,23 @@ class ApiService {
     }
   }
 
-  /// Get user game history (all played games)
-  Future<List<dynamic>?> getGameHistory(String token) async {
+  /// Get user game history between two dates (inclusive, most recent first).
+  /// One request: keep the window within the page size (500 games).
+  Future<List<dynamic>?> getGameHistory(
+    String token, {
+    String? gameMode,
+    DateTime? sinceDate,
+    DateTime? untilDate,
+  }) async {
     try {
+      final dateFormat = DateFormat('yyyy-MM-dd');
       final response = await http.get(
-        Uri.parse('$baseUrl/api/game/history'),
+        Uri.parse('$baseUrl/api/game/history').replace(queryParameters: {
+          'limit': '500',
+          if (gameMode != null) 'game_mode': gameMode,
+          if (sinceDate != null) 'since_date': dateFormat.format(sinceDate),
+          if (untilDate != null) 'until_date': dateFormat.format(untilDate),
+        }),
         headers: {
           'Authorization': 'Bearer $token',
         },
@@ -82,6 +82,8 @@ class ProgressBarWidget extends StatefulWidget {
 
 class _ProgressBarWidgetState extends State<ProgressBarWidget> {
   List<PlayerProgress> _players = [];
+  final Map<int, PlayerProgress> _playersById = {};
+  int? _boardVersion;
   Timer? _pollTimer;
   bool _isLoading = false;
 
@@ -95,6 +97,18 @@ class _ProgressBarWidgetState extends State<ProgressBarWidget> {
     });
   }
 
+  @override
+  void didUpdateWidget(covariant ProgressBarWidget oldWidget) {
+    super.didUpdateWidget(oldWidget);
+    // Partita o filtro cambiati: la versione precedente non vale più
+    if (oldWidget.gameDate != widget.gameDate ||
+        oldWidget.gameMode != widget.gameMode ||
+        oldWidget.showFriendsOnly != widget.showFriendsOnly ||
+        oldWidget.authToken != widget.authToken) {
+      _boardVersion = null;
+    }
+  }
+
   @override
   void dispose() {
     _pollTimer?.cancel();
@@ -107,8 +121,10 @@ class _ProgressBarWidgetState extends State<ProgressBarWidget> {
     setState(() => _isLoading = true);
 
     try {
-      final response = await ApiService().getActivePlayers(
+      // Delta polling: solo i giocatori cambiati dall'ultima versione
+      final response = await ApiService().getActivePlayersDelta(
         widget.gameDate,
+        since: _boardVersion,
         gameMode: widget.gameMode,
         friendsOnly: widget.showFriendsOnly,
         token: widget.authToken,
@@ -116,10 +132,28 @@ class _ProgressBarWidgetState extends State<ProgressBarWidget> {
 
       if (response != null && mounted) {
         setState(() {
-          _players = response
-              .map((json) =>
-                  PlayerProgress.fromJson(json as Map<String, dynamic>))
-              .toList();
+          if (response['full'] == true) {
+            _playersById.clear();
+          }
+          for (final json in response['players'] as List<dynamic>) {
+            final player =
+                PlayerProgress.fromJson(json as Map<String, dynamic>);
+            _playersById[player.userId] = player;
+          }
+          for (final userId in response['removed'] as List<dynamic>) {
+            _playersById.remove(userId);
+          }
+          _boardVersion = response['version'] as int?;
+
+          // Stesso ordine del server: vincitori e rank migliori prima
+          _players = _playersById.values.toList()
+            ..sort((a, b) {
+              if (a.won != b.won) return a.won ? -1 : 1;
+              if (a.bestRank != b.bestRank) {
+                return a.bestRank.compareTo(b.bestRank);
+              }
+              return a.userId.compareTo(b.userId);
+            });
         });
       }
     } catch (e) {
@@ -292,7 +326,7 @@ class _ProgressBarWidgetState extends State<ProgressBarWidget> {
                 child: ClipOval(
                   child: player.avatarPath != null
                       ? Image.network(
-                          '${ApiService.baseUrl}${player.avatarPath}',
+                          ApiService.avatarUrl(player.avatarPath!, size: 48),
                           fit: BoxFit.cover,
                           errorBuilder: (_, __, ___) =>
                               _buildDefaultAvatar(player, isCurrentUser),